@@ -23,6 +23,8 @@ if functions -q fish_prompt
     # Otherwise preserve the existing fish_prompt (could be starship or user's prompt)
 end
 functions -e __subshell_chpwd 2>/dev/null
+functions -e __subshell_starship_prompt 2>/dev/null
+set -e __subshell_starship_key
 # Note: preserve __subshell_original_fish_prompt to avoid losing the user's original prompt
 
 ### defaults
@@ -44,6 +46,16 @@ end
 # Core state management and rendering - shell-agnostic functionality
 ################################################################################
 
+# Inside/outside verdicts keyed by the raw $PWD string, so revisiting a
+# directory skips path resolution (real syscalls on autofs/NFS). fish has no
+# associative arrays: two parallel lists looked up with `contains -i`, bounded
+# to __subshell_verdict_max entries with the least recently used first, and
+# flushed whenever SUBSHELL_ROOT changes.
+set -g __subshell_verdict_dirs
+set -g __subshell_verdict_vals
+set -g __subshell_verdict_max 64
+set -e __subshell_root_key
+
 function subshell_update_state --description 'Core business logic: determine inside/outside status'
     # Algorithm: PWD is "inside" if it equals SUBSHELL_ROOT or is a subdirectory
     # Returns: sets SUBSHELL_OUTSIDE to 0 (inside) or 1 (outside)
@@ -52,31 +64,71 @@ function subshell_update_state --description 'Core business logic: determine ins
         set -gx SUBSHELL_OUTSIDE 0  # No root defined = always inside
         return
     end
-    
-    # Normalize paths - get absolute paths and strip trailing slashes  
+
+    # Resolve the root once per value; a new root invalidates every verdict
+    if not set -q __subshell_root_key; or test "$__subshell_root_key" != "$SUBSHELL_ROOT"
+        set -g __subshell_root_key $SUBSHELL_ROOT
+        set -g __subshell_root_resolved (string replace -r '/$' '' -- (path resolve -- "$SUBSHELL_ROOT"))
+        set -g __subshell_verdict_dirs
+        set -g __subshell_verdict_vals
+    end
+
+    set -l i (contains -i -- "$PWD" $__subshell_verdict_dirs)
+    if test -n "$i"
+        set -l verdict $__subshell_verdict_vals[$i]
+        # Hit: move to the most recently used end
+        if test $i -ne (count $__subshell_verdict_dirs)
+            set -e __subshell_verdict_dirs[$i]
+            set -e __subshell_verdict_vals[$i]
+            set -a __subshell_verdict_dirs $PWD
+            set -a __subshell_verdict_vals $verdict
+        end
+        set -gx SUBSHELL_OUTSIDE $verdict
+        return
+    end
+
+    # Miss: normalize to absolute and check if current path is inside root path
     set -l current_path (path resolve -- "$PWD")
-    set -l root_path (string replace -r '/$' '' -- "$SUBSHELL_ROOT")
-    
-    # Check if current path is inside root path
+    set -l root_path $__subshell_root_resolved
+    set -l verdict 1  # Outside root
     if test "$current_path" = "$root_path"
-        set -gx SUBSHELL_OUTSIDE 0  # Exact match = inside
-    else if string match -q "$root_path/*" "$current_path"
-        set -gx SUBSHELL_OUTSIDE 0  # Subdirectory = inside
-    else
-        set -gx SUBSHELL_OUTSIDE 1  # Outside root = outside
+        set verdict 0  # Exact match = inside
+    else if string match -q -- "$root_path/*" "$current_path"
+        set verdict 0  # Subdirectory = inside
     end
+
+    # Evict the least recently used entry when full
+    if test (count $__subshell_verdict_dirs) -ge $__subshell_verdict_max
+        set -e __subshell_verdict_dirs[1]
+        set -e __subshell_verdict_vals[1]
+    end
+    set -a __subshell_verdict_dirs $PWD
+    set -a __subshell_verdict_vals $verdict
+    set -gx SUBSHELL_OUTSIDE $verdict
 end
 
-function subshell_render_pre_prompt --description 'Render the prefix line above the base prompt'
-    if set -q SUBSHELL_OUTSIDE; and test $SUBSHELL_OUTSIDE -eq 1
-        set -l color (set_color brred)
-        set -l normal (set_color normal)
-        printf "‼️  %s%s is outside project root (%s)%s ‼️" "$color" "$SUBSHELL_PROMPT" "$SUBSHELL_ROOT" "$normal"
+# Color escapes are resolved once at activation, not on every render
+set -g __subshell_color_outside (set_color brred)
+set -g __subshell_color_inside (set_color yellow)
+set -g __subshell_color_normal (set_color normal)
+set -e __subshell_prefix_key
+
+function subshell_render_prefix --description 'Render the prefix into __subshell_prefix, memoized per state'
+    set -l key "$SUBSHELL_OUTSIDE|$SUBSHELL_PROMPT|$SUBSHELL_ROOT"
+    if set -q __subshell_prefix_key; and test "$key" = "$__subshell_prefix_key"
+        return
+    end
+    if test "$SUBSHELL_OUTSIDE" = 1
+        set -g __subshell_prefix "‼️  $__subshell_color_outside$SUBSHELL_PROMPT is outside project root ($SUBSHELL_ROOT)$__subshell_color_normal ‼️"
     else
-        set -l color (set_color yellow)
-        set -l normal (set_color normal)
-        printf "📂 %s%s%s" "$color" "$SUBSHELL_PROMPT" "$normal"
+        set -g __subshell_prefix "📂 $__subshell_color_inside$SUBSHELL_PROMPT$__subshell_color_normal"
     end
+    set -g __subshell_prefix_key $key
+end
+
+function subshell_render_pre_prompt --description 'Render the prefix line above the base prompt'
+    subshell_render_prefix
+    printf '%s' "$__subshell_prefix"
 end
 
 ################################################################################
@@ -100,63 +152,36 @@ end
 
 # --- Starship Implementation ---
 
-function _subshell_get_bundled_starship_config --description 'Get the bundled starship config content'
-    # Hardcoded starship config - single source of truth
-    printf '[custom.subshell_inside]\n'
-    printf 'when = '\''test "${SUBSHELL_OUTSIDE:-0}" -eq 0 && test -n "${SUBSHELL_PROMPT:-}"'\''\n'
-    printf 'command = '\''printf %%s "${SUBSHELL_PROMPT:-subshell}"'\''\n'
-    printf 'symbol = '\''📂'\''\n'
-    printf 'style = '\''blue'\''\n'
-    printf 'format = '\''[$symbol$output]($style)'\''\n'
-    printf 'shell = '\''sh'\''\n'
-    printf '\n[custom.subshell_outside]\n'
-    printf 'when = '\''test "${SUBSHELL_OUTSIDE:-0}" -eq 1 && test -n "${SUBSHELL_PROMPT:-}"'\''\n'
-    printf 'command = '\''printf "%%s (outside %%s)" "${SUBSHELL_PROMPT:-subshell}" "${SUBSHELL_ROOT}"'\''\n'
-    printf 'symbol = '\''‼️ '\''\n'
-    printf 'style = '\''red bold'\''\n'
-    printf 'format = '\''[$symbol$output]($style)'\''\n'
-    printf 'shell = '\''sh'\''\n'
-end
-
-function _subshell_create_starship_config --description 'Generate ephemeral starship config with subshell modules'
-    # Skip if user already points STARSHIP_CONFIG to our generated file
-    if set -q STARSHIP_CONFIG; and string match -q "*subshell-starship-*" "$STARSHIP_CONFIG"; and test -f "$STARSHIP_CONFIG"
-        return 0
-    end
-    
-    # Find user's existing config
-    set -l orig_config ''
-    if set -q STARSHIP_CONFIG; and test -r "$STARSHIP_CONFIG"
-        set orig_config $STARSHIP_CONFIG
-    else if set -q XDG_CONFIG_HOME; and test -r "$XDG_CONFIG_HOME/starship.toml"
-        set orig_config "$XDG_CONFIG_HOME/starship.toml"
-    else if test -r "$HOME/.config/starship.toml"
-        set orig_config "$HOME/.config/starship.toml"
+function subshell_starship_export --description 'Export the indicator text read by the starship env_var modules'
+    # Runs once per state change; starship reads the text from its
+    # environment, so rendering never spawns sh
+    set -q SUBSHELL_OUTSIDE; or subshell_update_state
+    set -l key "$SUBSHELL_OUTSIDE|$SUBSHELL_PROMPT|$SUBSHELL_ROOT"
+    if set -q __subshell_starship_key; and test "$key" = "$__subshell_starship_key"
+        return
     end
-    
-    # Create temporary config by combining user config + bundled starship config
-    set -l tmpdir (string trim -- (printf %s "$TMPDIR"))
-    if test -z "$tmpdir"; or not test -d "$tmpdir"; set tmpdir /tmp; end
-    set -l temp_config "$tmpdir/subshell-starship-"(id -u)"-$fish_pid.toml"
-    
-    # Start with user's existing config (if any)
-    if test -n "$orig_config"
-        cat "$orig_config" > $temp_config
+    set -g __subshell_starship_key $key
+    set -e SUBSHELL_STARSHIP_INSIDE
+    set -e SUBSHELL_STARSHIP_OUTSIDE
+    test -n "$SUBSHELL_PROMPT"; or return 0
+    if test "$SUBSHELL_OUTSIDE" = 1
+        set -gx SUBSHELL_STARSHIP_OUTSIDE "$SUBSHELL_PROMPT (outside $SUBSHELL_ROOT)"
     else
-        printf '' > $temp_config
+        set -gx SUBSHELL_STARSHIP_INSIDE $SUBSHELL_PROMPT
     end
-    
-    # Append our bundled starship modules
-    printf '\n# --- subshell integration (auto-generated) ---\n' >> $temp_config
-    _subshell_get_bundled_starship_config >> $temp_config
-    
-    set -gx STARSHIP_CONFIG $temp_config
-    return 0
 end
 
 function subshell_init_starship --description 'Initialize starship integration'
-    # Create ephemeral config
-    _subshell_create_starship_config
+    # The launcher merges the user's starship.toml with the bundled modules into
+    # a content-addressed cache file and passes its path along; use it unless disabled
+    if test -z "$SUBSHELL_NO_EPHEMERAL_STARSHIP"; and test -r "$SUBSHELL_STARSHIP_CONFIG"
+        set -gx STARSHIP_CONFIG $SUBSHELL_STARSHIP_CONFIG
+    end
+    subshell_starship_export
+    # Catch state changes (PWD, SUBSHELL_PROMPT) before each starship render
+    function __subshell_starship_prompt --on-event fish_prompt
+        subshell_starship_export
+    end
 end
 
 # --- Generic Implementation ---
@@ -167,9 +192,14 @@ function subshell_init_generic --description 'Initialize generic prompt wrapping
         if functions -q fish_prompt
             functions -c fish_prompt __subshell_original_fish_prompt
         else
+            # Resolve user and short host once instead of running whoami and
+            # hostname on every render
+            set -g __subshell_user $USER
+            test -n "$__subshell_user"; or set -g __subshell_user (whoami)
+            set -g __subshell_host (string split -m 1 -f 1 . -- $hostname)
             function __subshell_original_fish_prompt --description 'Fallback base prompt'
                 # Match fish's default prompt format: user@host path>
-                printf '%s@%s %s> ' (whoami) (hostname -s) (prompt_pwd)
+                printf '%s@%s %s> ' $__subshell_user $__subshell_host (prompt_pwd)
             end
         end
     end
@@ -188,19 +218,16 @@ function subshell_init_generic --description 'Initialize generic prompt wrapping
         end
 
         # Render prefix above original prompt
-        set -l base (begin; __subshell_original_fish_prompt; end | string collect)
-        
+        set -l base (__subshell_original_fish_prompt | string collect)
+        subshell_render_prefix
+
         # Check if the captured prompt starts with a newline and handle accordingly
-        if string match -q -r '^\n' "$base"
+        if string match -q -- \n'*' "$base"
             # Preserve the leading blank line: print it first, then subshell prompt, then cleaned base
-            set -l clean_base (string replace -r '^[\n]' '' -- "$base")
-            printf '\n'
-            subshell_render_pre_prompt
-            printf '\n%s' "$clean_base"
+            printf '\n%s\n%s' "$__subshell_prefix" (string sub -s 2 -- "$base" | string collect)
         else
             # Regular case: concatenate with newline after prefix
-            subshell_render_pre_prompt
-            printf '\n%s' "$base"
+            printf '%s\n%s' "$__subshell_prefix" "$base"
         end
     end
 end
@@ -217,7 +244,8 @@ end
 # Run detections and initialize appropriate implementation
 if subshell_detect_starship
     subshell_init_starship
-    # For starship: do NOT install prompt wrapper - let starship handle everything via custom modules
+    # For starship: do NOT install prompt wrapper - starship's env_var modules render
+    # the indicator from the variables subshell_starship_export sets
 else
     subshell_init_generic
 end
\ No newline at end of file
@@ -1,13 +1,16 @@
 #! /usr/bin/env python3
 
+# Keep module-level imports to the minimum the hot `activate` path needs.
+# Everything else (argparse, subprocess, tempfile, textwrap, pathlib) is
+# imported inside the functions that use it; see `subshell --profile-startup`.
 import os
-import argparse
-import pty
 import sys
-from tempfile import TemporaryDirectory
-from textwrap import dedent
-import subprocess
-from pathlib import Path
+import time
+
+# Reference points for --profile-startup: wall clock when the module body
+# starts, and the CPU time the interpreter spent getting there
+_T_START = time.perf_counter()
+_CPU_START = time.process_time()
 
 
 ########################
@@ -16,6 +19,7 @@ from pathlib import Path
 
 def run_command(cmd, shell=True, capture=False):
     """Run a command and return success status (and stdout if capture=True)."""
+    import subprocess
     try:
         if capture:
             result = subprocess.run(cmd, shell=shell, capture_output=True, text=True)
@@ -32,13 +36,42 @@ def load_script(name):
     if scripts:
         return scripts[name]
     else:
-        return (Path(__file__).parent / "scripts" / name).read_text()
+        with open(os.path.join(os.path.dirname(__file__), "scripts", name)) as f:
+            return f.read()
+
+
+class StartupProfile:
+    """Wall time per launch phase, reported by `subshell --profile-startup`.
+
+    Phases are measured from start, when the module body began. The CPU time
+    the interpreter spent before that (interpreter_cpu) is on another clock,
+    so it is reported on its own line and left out of the total.
+    """
+    def __init__(self, start, interpreter_cpu=None):
+        self.last = start
+        self.phases = []
+        self.interpreter_cpu = interpreter_cpu
+
+    def mark(self, name):
+        """Record the wall time since the previous mark as phase name."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self, file=sys.stderr):
+        total = sum(t for _, t in self.phases)
+        for name, t in self.phases:
+            print(f"{name:<12} {t * 1000:8.2f} ms", file=file)
+        print(f"{'total':<12} {total * 1000:8.2f} ms wall", file=file)
+        if self.interpreter_cpu is not None:
+            print(f"{'interpreter':<12} {self.interpreter_cpu * 1000:8.2f} ms CPU before the module ran, not in total",
+                  file=file)
 
 ########################
 ### Secrets management
 ###
 
-def _read_subshell_env_entries(root_path: Path):
+def _read_subshell_env_entries(root_path: "Path"):
     """Read environment entries from a .subshell file in the given root.
 
     Returns a list of raw values following `environment=` preserving order.
@@ -66,56 +99,207 @@ def _read_subshell_env_entries(root_path: Path):
     return entries
 
 
-def _parse_dotenv_file(path: Path):
-    """Parse a minimal dotenv file into a dict.
+def _parse_dotenv_file(path: "Path"):
+    """Parse a dotenv file (see _parse_dotenv_lines), reading it incrementally.
 
-    Supports simple KEY=VALUE lines. Ignores blank lines and comments (# ...).
-    Strips surrounding single or double quotes from VALUE if present.
-    Does not perform variable expansion or export directives.
+    Returns (env_dict, errors_list).
     """
-    env = {}
     try:
-        for raw in path.read_text().splitlines():
-            line = raw.strip()
-            if not line or line.startswith('#'):
-                continue
-            # Allow optional leading 'export '
-            if line.lower().startswith('export '):
-                line = line[7:].lstrip()
-            if '=' not in line:
-                continue
-            key, val = line.split('=', 1)
-            key = key.strip()
-            # Don't accept empty keys
-            if not key:
-                continue
-            val = val.strip()
-            # Strip one layer of matching quotes
-            if (val.startswith('"') and val.endswith('"')) or (val.startswith("'") and val.endswith("'")):
-                val = val[1:-1]
-            env[key] = val
-    except Exception:
-        # On parse errors, treat as empty to avoid crashing the launcher
-        return {}
-    return env
+        with open(path, encoding='utf-8') as f:
+            return _parse_dotenv_lines(_read_lines(f), str(path))
+    except OSError as e:
+        return {}, [f"Could not read secrets file {path}: {e.strerror}"]
+    except UnicodeDecodeError:
+        # Replacing the bad bytes would export a corrupted secret
+        return {}, [f"Secrets file {path} is not valid UTF-8; nothing was loaded from it"]
+
+
+def _read_lines(f, size: int = 1 << 16):
+    """Yield the lines of text file f without line endings, reading it in blocks.
+
+    Splitting large blocks is much cheaper than iterating the file line by
+    line, and memory stays bounded by the block size.
+    """
+    tail = ''
+    while True:
+        block = f.read(size)
+        if not block:
+            break
+        lines = (tail + block).split('\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def _parse_dotenv_text(text: str, source: str = '<input>'):
+    """Parse dotenv content held in a string. Returns (env_dict, errors_list)."""
+    return _parse_dotenv_lines(text.splitlines(keepends=True), source)
+
+
+# `\$` becomes `$$`, the escape for a literal `$` understood by _interpolate_env
+_DOTENV_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\', '$': '$$'}
+
+
+def _dotenv_unescape(value: str):
+    """Decode backslash escapes of a double-quoted value; unknown ones are kept."""
+    if '\\' not in value:
+        return value
+    out = []
+    i = 0
+    while True:
+        j = value.find('\\', i)
+        if j < 0 or j == len(value) - 1:
+            out.append(value[i:])
+            return ''.join(out)
+        out.append(value[i:j])
+        c = value[j + 1]
+        out.append(_DOTENV_ESCAPES.get(c, '\\' + c))
+        i = j + 2
+
+
+def _dotenv_closing_quote(text: str, quote: str, start: int = 0):
+    """Index of the closing quote in text, skipping backslash-escaped double quotes."""
+    i = text.find(quote, start)
+    if quote == "'":
+        return i
+    while i > 0:
+        backslashes = 0
+        while i - backslashes > 0 and text[i - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return i
+        i = text.find(quote, i + 1)
+    return i
+
+
+def _is_env_key(key: str):
+    """Letters, digits, '_' and '.', not starting with a digit."""
+    return key.isascii() and not key[:1].isdigit() and key.replace('_', 'x').replace('.', 'x').isalnum()
 
 
-def _resolve_config_dir(base_env: dict) -> Path:
+def _parse_dotenv_lines(lines, source: str = '<input>', lineno: int = 0):
+    """Parse dotenv lines in a single pass without holding the whole input.
+
+    Returns (env_dict, errors_list). Supports:
+      - blank lines and full-line comments (# ...)
+      - an optional leading `export `
+      - unquoted values, with inline comments after whitespace (`A=b # note`)
+      - 'single-quoted' values, taken literally
+      - "double-quoted" values with \\n, \\t, \\r, \\", \\$ and \\\\ escapes
+      - quoted values spanning multiple lines (certificates, JSON blobs)
+    A malformed line is reported as `source:line: message` and skipped; the
+    rest of the file still loads. A quote still open at the end of the input
+    leaves its key unset, and the lines after it are read as entries of their
+    own. Does not perform variable expansion. lineno counts the lines before
+    these, for reading such a remainder.
+    """
+    env = {}
+    errors = []
+    lines = iter(lines)
+    for raw in lines:
+        lineno += 1
+        # Fast path for the common single-line forms [export ]KEY=value,
+        # KEY="value" and KEY='value' with no comment, escape or embedded
+        # quote; it gives the same result as the general path below
+        key, sep, value = raw.partition('=')
+        if sep and '#' not in value:
+            if key.startswith(('export ', 'export\t')):
+                key = key[7:].lstrip()
+            if key.isidentifier() and key.isascii():
+                value = value.strip()
+                quote = value[:1]
+                if quote not in ('"', "'"):
+                    env[key] = value
+                    continue
+                inner = value[1:-1]
+                if len(value) > 1 and value[-1] == quote and quote not in inner and '\\' not in inner:
+                    env[key] = inner if quote == '"' else inner.replace('$', '$$')
+                    continue
+        line = raw.rstrip('\r\n')
+        stripped = line.strip()
+        if not stripped or stripped[0] == '#':
+            continue
+        if stripped.startswith(('export ', 'export\t')):
+            stripped = stripped[7:].lstrip()
+        key, sep, rest = stripped.partition('=')
+        key = key.strip()
+        if not sep:
+            errors.append(f"{source}:{lineno}: expected KEY=VALUE")
+            continue
+        if not (key.isascii() and key.isidentifier()) and not _is_env_key(key):
+            errors.append(f"{source}:{lineno}: invalid variable name {key!r}")
+            continue
+
+        value = rest.lstrip()
+        quote = value[:1]
+        if quote not in ('"', "'"):
+            # Unquoted: an inline comment starts at a '#' preceded by whitespace
+            i = rest.find('#')
+            while i > 0 and rest[i - 1] not in ' \t':
+                i = rest.find('#', i + 1)
+            env[key] = (rest[:i] if i > 0 else rest).strip()
+            continue
+
+        # Quoted: keep reading lines until the closing quote
+        start_line = lineno
+        body = value[1:]
+        end = _dotenv_closing_quote(body, quote)
+        chunks = []
+        while end < 0:
+            chunks.append(body)
+            body = next(lines, None)
+            if body is None:
+                break
+            lineno += 1
+            body = body.rstrip('\r\n')
+            end = _dotenv_closing_quote(body, quote)
+        if body is None:
+            errors.append(f"{source}:{start_line}: unterminated {quote} quote for {key}, which is not set")
+            # Read the lines it swallowed as entries. None of them holds this
+            # quote character, so at most the other one recurses again
+            rest_env, rest_errors = _parse_dotenv_lines(chunks[1:], source, start_line)
+            env.update(rest_env)
+            errors.extend(rest_errors)
+            break
+        chunks.append(body[:end])
+        trailing = body[end + 1:].strip()
+        if trailing and trailing[0] != '#':
+            errors.append(f"{source}:{lineno}: unexpected text after closing quote for {key}")
+            continue
+        value = '\n'.join(chunks)
+        # Single-quoted values are literal: protect `$` from interpolation
+        env[key] = _dotenv_unescape(value) if quote == '"' else value.replace('$', '$$')
+    return env, errors
+
+
+def _resolve_config_dir(base_env: dict) -> "Path":
+    from pathlib import Path
     xdg = base_env.get('XDG_CONFIG_HOME')
     if xdg:
         return Path(os.path.expanduser(xdg)).expanduser() / 'subshell'
     return Path(os.path.expanduser('~/.config')) / 'subshell'
 
 
+def _resolve_cache_dir(base_env: dict) -> str:
+    xdg = base_env.get('XDG_CACHE_HOME')
+    if xdg:
+        return os.path.join(os.path.expanduser(xdg), 'subshell')
+    return os.path.join(os.path.expanduser('~/.cache'), 'subshell')
+
+
 def _classify_env_value(value: str):
-    """Classify an environment value as ('config', name) or ('file', path_str).
+    """Classify an environment value as ('config', name), ('file', path_str)
+    or ('exec', command).
 
-    Supports optional prefixes: config:NAME and file:PATH (case-insensitive).
-    Without prefix: if it contains a '/', or starts with ./, ../, ~/, or /,
-    treat as file; otherwise treat as config name.
+    Supports optional prefixes: config:NAME, file:PATH and exec:COMMAND
+    (case-insensitive). Without prefix: if it contains a '/', or starts with
+    ./, ../, ~/, or /, treat as file; otherwise treat as config name.
     """
     v = value.strip()
     lower = v.lower()
+    if lower.startswith('exec:'):
+        return 'exec', v[len('exec:'):].strip()
     if lower.startswith('config:'):
         return 'config', v[len('config:'):].strip()
     if lower.startswith('file:'):
@@ -127,35 +311,487 @@ def _classify_env_value(value: str):
     return 'config', v
 
 
-def _load_secrets_from_root(env: dict):
+SECRETS_EXEC_TIMEOUT = 10.0
+SECRETS_EXEC_WORKERS = 8
+
+
+def _exec_timeout(env: dict) -> float:
+    try:
+        return float(env.get('SUBSHELL_EXEC_TIMEOUT') or SECRETS_EXEC_TIMEOUT)
+    except ValueError:
+        return SECRETS_EXEC_TIMEOUT
+
+
+def _run_env_command(command: str, cwd, env: dict, timeout: float):
+    """Run an `exec:` entry and parse its stdout as dotenv.
+
+    Returns (data, errors). The command runs through `sh -c` in its own
+    session, with stdin closed, so that a timeout can kill the whole pipeline.
+    """
+    import signal
+    import subprocess
+    try:
+        proc = subprocess.Popen(
+            command, shell=True, cwd=cwd, env=env, text=True, errors='replace',
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+    except OSError as e:
+        return {}, [f"Secrets command failed ({e}): {command}"]
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        proc.communicate()
+        return {}, [f"Secrets command timed out after {timeout:g}s: {command}"]
+    if proc.returncode != 0:
+        lines = err.strip().splitlines()
+        detail = lines[-1] if lines else f"exit status {proc.returncode}"
+        return {}, [f"Secrets command failed ({detail}): {command}"]
+    return _parse_dotenv_text(out, f"exec:{command}")
+
+
+########################
+### Resolved environment cache
+###
+# One marshal file per (root, config dir) holding the merged secrets plus a
+# stat signature of .subshell and of every file it referenced, by the path
+# written in .subshell. A warm launch only re-stats those files. Entries hold secrets, so the directory is
+# 0700 and files are 0600. Total size is bounded; the least recently used
+# entries (by mtime, refreshed on every hit) are evicted first.
+
+ENV_CACHE_VERSION = 4
+ENV_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+
+def _stat_signature(path):
+    """Return a signature of the regular file at path, or None if there is none.
+
+    path is not resolved: the signature covers both the entry itself (lstat)
+    and the file it leads to (stat), so repointing a symlink such as
+    .env -> staging.env changes it even when neither file changed.
+    """
+    import stat
+    try:
+        link = os.lstat(path)
+        st = os.stat(path) if stat.S_ISLNK(link.st_mode) else link
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return (link.st_ino, link.st_mtime_ns, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _env_cache_path(env: dict, key: str):
+    import zlib
+    cache_dir = os.path.join(_resolve_cache_dir(env), 'env')
+    return os.path.join(cache_dir, f'{zlib.crc32(key.encode()):08x}.bin')
+
+
+def _read_env_cache(cache_path: str, key: str):
+    """Return cached (updates, errors) if every source file is unchanged, else None."""
+    import marshal
+    try:
+        with open(cache_path, 'rb') as f:
+            version, cached_key, sources, updates, errors = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != ENV_CACHE_VERSION or cached_key != key:
+        return None
+    for path, signature in sources:
+        if _stat_signature(path) != signature:
+            return None
+    try:
+        os.utime(cache_path)  # mark as recently used
+    except OSError:
+        pass
+    return updates, errors
+
+
+def _write_private_file(path: str, value):
+    """Atomically write value (marshal) to path with mode 0600 in a 0700 dir."""
+    import marshal
+    _write_private_bytes(path, marshal.dumps(value))
+
+
+def _write_private_bytes(path: str, data: bytes):
+    """Atomically write data to path with mode 0600 in a 0700 dir."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_env_cache(cache_path: str, key: str, sources, updates: dict, errors: list):
+    try:
+        _write_private_file(cache_path, (ENV_CACHE_VERSION, key, sources, updates, errors))
+        _evict_env_cache(os.path.dirname(cache_path))
+    except OSError:
+        # The cache is an optimization only; never fail a launch over it
+        pass
+
+
+def _evict_env_cache(cache_dir: str, max_bytes: int = ENV_CACHE_MAX_BYTES):
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.bin'):
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.unlink(path)
+        total -= size
+
+
+########################
+### Variable interpolation
+###
+# Values may reference other keys from any loaded source, or the parent
+# environment, as ${NAME} or ${NAME:-default}; `$$` is a literal `$`. Each
+# value is parsed once, references form a dependency graph, and keys are
+# resolved depth-first in dependency order with every result memoized, so
+# large bundles of cross-referencing keys resolve in linear time.
+
+def _parse_template(text: str):
+    """Split text into literal strings and (name, default_parts|None) references.
+
+    Returns (parts, error).
+    """
+    if '$' not in text:
+        return [text], None
+    parts = []
+    literal = []
+    i = 0
+    n = len(text)
+    while i < n:
+        j = text.find('$', i)
+        if j < 0:
+            literal.append(text[i:])
+            break
+        literal.append(text[i:j])
+        if text.startswith('$$', j):
+            literal.append('$')
+            i = j + 2
+            continue
+        if not text.startswith('${', j):
+            literal.append('$')
+            i = j + 1
+            continue
+        depth = 1
+        k = j + 2
+        while k < n and depth:
+            if text[k] == '{':
+                depth += 1
+            elif text[k] == '}':
+                depth -= 1
+            k += 1
+        if depth:
+            return None, f"unterminated '${{' in {text!r}"
+        inner = text[j + 2:k - 1]
+        name, sep, default = inner.partition(':-')
+        if not (name.isascii() and name.isidentifier()) and not _is_env_key(name):
+            return None, f"unsupported reference '${{{inner}}}'"
+        default_parts = None
+        if sep:
+            default_parts, error = _parse_template(default)
+            if error:
+                return None, error
+        if literal:
+            parts.append(''.join(literal))
+            literal = []
+        parts.append((name, default_parts))
+        i = k
+    if literal:
+        parts.append(''.join(literal))
+    return parts, None
+
+
+def _template_refs(parts):
+    for part in parts:
+        if not isinstance(part, str):
+            name, default = part
+            yield name
+            if default:
+                yield from _template_refs(default)
+
+
+def _interpolate_env(values: dict, parent: dict):
+    """Expand ${NAME} and ${NAME:-default} references in values.
+
+    A name resolves to another loaded key, else to the parent environment,
+    else to the default (or ''). A key referring to itself (PATH=${PATH}:...)
+    sees the parent's value. Returns (resolved, errors). Keys on a reference
+    cycle, and values that cannot be parsed, are reported and keep their
+    unexpanded text (with `$$` back to `$`) rather than a partial expansion.
+    """
+    errors = []
+    templates = {}
+    unexpanded = set()
+    for key, value in values.items():
+        parts, error = _parse_template(value)
+        if error:
+            errors.append(f"Cannot expand {key}: {error}")
+            unexpanded.add(key)
+            parts = []
+        templates[key] = parts
+
+    resolved = {}
+
+    def render(parts, key):
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            name, default = part
+            if name == key or name not in templates:
+                value = parent.get(name)
+            else:
+                value = resolved[name]
+            if not value and default is not None:
+                value = render(default, key)
+            out.append(value or '')
+        return ''.join(out)
+
+    def resolve(keys):
+        if len(keys) > 1:
+            errors.append(f"Circular reference: {' -> '.join(keys + keys[:1])}")
+            unexpanded.update(keys)
+        for key in keys:
+            if key in unexpanded:
+                resolved[key] = values[key].replace('$$', '$')
+            else:
+                resolved[key] = render(templates[key], key)
+
+    # Iterative Tarjan walk over the strongly connected components of the
+    # reference graph. A component is complete only after every component it
+    # refers to, so dependencies resolve before dependents; a component of
+    # several keys is a cycle.
+    index = {}
+    lowlink = {}
+    pending = []
+    position = {}
+    for start in templates:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        position[start] = len(pending)
+        pending.append(start)
+        path = [start]
+        stack = [iter(_template_refs(templates[start]))]
+        while stack:
+            key = path[-1]
+            for dep in stack[-1]:
+                if dep == key or dep not in templates:
+                    continue
+                if dep not in index:
+                    index[dep] = lowlink[dep] = len(index)
+                    position[dep] = len(pending)
+                    pending.append(dep)
+                    path.append(dep)
+                    stack.append(iter(_template_refs(templates[dep])))
+                    break
+                if dep in position:
+                    # Still pending: dep is on the current component
+                    lowlink[key] = min(lowlink[key], index[dep])
+            else:
+                stack.pop()
+                path.pop()
+                if path:
+                    lowlink[path[-1]] = min(lowlink[path[-1]], lowlink[key])
+                if lowlink[key] == index[key]:
+                    component = pending[position[key]:]
+                    del pending[position[key]:]
+                    for member in component:
+                        del position[member]
+                    resolve(component)
+    return {key: resolved[key] for key in values}, errors
+
+
+########################
+### Project root discovery
+###
+# A .subshell can run commands (exec:) and set PATH or LD_PRELOAD, so the
+# upward search only trusts what the user controls: a .subshell, and every
+# directory it walks through, must be owned by the user (or root) and not be
+# world-writable. The walk ends before the first directory that fails (/tmp,
+# shared mounts); a .subshell that fails is reported on stderr and ends it
+# too. Group write is accepted: under the common umask 002 with per-user
+# groups it is how every checkout looks.
+#
+# Directories known not to contain a .subshell are remembered for a short
+# while, so repeated launches deep inside large trees (often on NFS) skip
+# the stat of every ancestor. Creating a new .subshell is picked up once the
+# entry expires.
+
+DISCOVERY_NEGATIVE_TTL = 30.0
+
+
+def _distrust(st) -> str:
+    """Why a file or directory with stat result st is not trusted, or ''."""
+    if st.st_uid not in (os.getuid(), 0):
+        return f'owned by uid {st.st_uid}'
+    if st.st_mode & 0o002:
+        return 'world-writable'
+    return ''
+
+
+def _find_subshell_root(start: str, home: str, cache_path=None):
+    """Return the nearest directory at or above start with a .subshell file.
+
+    The walk stops at the filesystem root, at home when start is inside it,
+    and before the first directory that is not trusted (see _distrust). A
+    .subshell that is not trusted, or sits in such a directory, is reported
+    on stderr and not used.
+    """
+    import marshal
+    import stat
+    now = time.time()
+    negative = {}
+    if cache_path:
+        try:
+            with open(cache_path, 'rb') as f:
+                negative = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            negative = {}
+    changed = False
+
+    found = None
+    directory = os.path.abspath(start)
+    home = os.path.abspath(home) if home else None
+    while True:
+        # Only trusted directories without a .subshell are remembered
+        if negative.get(directory, 0) <= now:
+            try:
+                st = os.stat(directory)
+            except OSError:
+                break
+            reason = _distrust(st)
+            if reason:
+                reason = f'{directory} is {reason}'
+            candidate = os.path.join(directory, '.subshell')
+            try:
+                candidate_st = os.stat(candidate)
+            except OSError:
+                candidate_st = None
+            if candidate_st is not None and stat.S_ISREG(candidate_st.st_mode):
+                if not reason and _distrust(candidate_st):
+                    reason = f'it is {_distrust(candidate_st)}'
+                if reason:
+                    print(f'subshell: ignoring {candidate}: {reason}', file=sys.stderr)
+                else:
+                    found = directory
+                break
+            if reason:
+                break
+            negative[directory] = now + DISCOVERY_NEGATIVE_TTL
+            changed = True
+        parent = os.path.dirname(directory)
+        if directory == home or parent == directory:
+            break
+        directory = parent
+
+    if cache_path and changed:
+        try:
+            _write_private_file(cache_path, {d: t for d, t in negative.items() if t > now})
+        except OSError:
+            pass
+    return found
+
+
+def _load_secrets_from_root(env: dict, use_cache: bool = True):
     """Discover and load secrets based on SUBSHELL_ROOT and .subshell file.
 
     Returns (updates_dict, errors_list). updates_dict are env vars to merge
     into the launched shell environment. errors_list contains human-readable
-    error strings for any missing secret files.
+    error strings for any missing secret files or failed commands.
+
+    `exec:` entries run concurrently (see _run_env_command); results still
+    merge in declaration order. ${VAR} references are then expanded (see
+    _interpolate_env). Merged sources are cached (see _read_env_cache)
+    unless use_cache is False or any entry is a command.
     """
+    from pathlib import Path
     updates = {}
     errors = []
 
     root_val = env.get('SUBSHELL_ROOT')
     if not root_val:
-        # Fallback: if .subshell exists in current working directory, use PWD
-        pwd = Path(env.get('PWD') or os.getcwd())
-        if (pwd / '.subshell').is_file():
-            root_val = str(pwd)
+        # Fallback: the nearest directory at or above PWD holding a .subshell
+        discovery_cache = os.path.join(_resolve_cache_dir(env), 'discovery.bin') if use_cache else None
+        root_val = _find_subshell_root(env.get('PWD') or os.getcwd(), env.get('HOME'), discovery_cache)
+        if root_val:
             # Also propagate this decision to the child environment by updating env
             env['SUBSHELL_ROOT'] = root_val
         else:
             return updates, errors
     # Resolve to absolute path
     root_path = Path(os.path.expanduser(root_val)).resolve()
-    entries = _read_subshell_env_entries(root_path)
-    if not entries:
-        return updates, errors
-
     config_dir = _resolve_config_dir(env)
-    for raw in entries:
-        kind, val = _classify_env_value(raw)
+
+    cache_key = f'{root_path}\0{config_dir}'
+    cache_path = _env_cache_path(env, cache_key) if use_cache else None
+    cached = _read_env_cache(cache_path, cache_key) if cache_path else None
+    if cached is not None:
+        raw, errors = cached
+    else:
+        raw, errors = _read_secret_sources(env, root_path, config_dir, cache_path, cache_key)
+
+    # Interpolation reads the parent environment, so it runs after the cache
+    updates, interpolation_errors = _interpolate_env(raw, env)
+    return updates, errors + interpolation_errors
+
+
+def _read_secret_sources(env: dict, root_path: "Path", config_dir: "Path", cache_path, cache_key: str):
+    """Load and merge every `environment=` entry of root_path/.subshell.
+
+    Returns (raw_updates, errors) before interpolation and writes them to
+    cache_path when all sources are static.
+    """
+    updates = {}
+    errors = []
+    subshell_file = str(root_path / '.subshell')
+    sources = [(subshell_file, _stat_signature(subshell_file))]
+    entries = [_classify_env_value(raw) for raw in _read_subshell_env_entries(root_path)]
+
+    commands = sum(1 for kind, _ in entries if kind == 'exec')
+    if commands:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(commands, SECRETS_EXEC_WORKERS)) as pool:
+            _merge_secret_sources(entries, env, root_path, config_dir, updates, errors, sources, pool)
+        # Command output can change between runs; only static sources are cached
+        cache_path = None
+    else:
+        _merge_secret_sources(entries, env, root_path, config_dir, updates, errors, sources)
+
+    if cache_path:
+        _write_env_cache(cache_path, cache_key, sources, updates, errors)
+    return updates, errors
+
+
+def _merge_secret_sources(entries, env: dict, root_path: "Path", config_dir: "Path",
+                          updates: dict, errors: list, sources: list, pool=None):
+    """Load classified entries into updates/errors, recording file signatures in sources.
+
+    Commands are submitted to pool first and run concurrently while files are
+    read; each entry's result is a (data, errors) tuple or a future of one,
+    kept in declaration order so later entries still override earlier ones.
+    """
+    from pathlib import Path
+    timeout = _exec_timeout(env)
+    results = []
+    for kind, val in entries:
+        if kind == 'exec':
+            results.append((val, pool.submit(_run_env_command, val, str(root_path), dict(env), timeout)))
+            continue
         if kind == 'config':
             dotenv_path = config_dir / val
         else:
@@ -163,67 +799,394 @@ def _load_secrets_from_root(env: dict):
             p = val
             # Expand ~ first
             p = os.path.expanduser(p)
-            dotenv_path = Path(p)
-            if not dotenv_path.is_absolute():
-                dotenv_path = (root_path / dotenv_path).resolve()
+            # Not resolved: the cache signs the path as written (see _stat_signature)
+            dotenv_path = root_path / p
 
-        if not Path(dotenv_path).is_file():
-            errors.append(f"Missing secrets file: {dotenv_path}")
+        # Stat once: the signature both detects missing files and keys the cache
+        signature = _stat_signature(dotenv_path)
+        sources.append((str(dotenv_path), signature))
+        if signature is None:
+            results.append((val, ({}, [f"Missing secrets file: {dotenv_path}"])))
             continue
 
-        data = _parse_dotenv_file(Path(dotenv_path))
-        # Later files override earlier ones on key collisions
-        updates.update(data)
+        results.append((val, _parse_dotenv_file(Path(dotenv_path))))
 
-    return updates, errors
+    for val, result in results:
+        if isinstance(result, tuple):
+            data, entry_errors = result
+        else:
+            try:
+                data, entry_errors = result.result()
+            except Exception as e:
+                # Reported like a failed command; the other entries still load
+                data, entry_errors = {}, [f"Secrets command failed ({e!r}): {val}"]
+        errors.extend(entry_errors)
+        # Later entries override earlier ones on key collisions
+        updates.update(data)
 
 ##############
 ### Shells
 ###
 
-class FishShell:
-    def __str__(self):
-        return "fish"
+def _session_dirs_root():
+    """Per-user parent directory for session dirs, or None if it is unsafe to use."""
+    import tempfile
+    root = os.path.join(tempfile.gettempdir(), f'subshell-{os.getuid()}')
+    try:
+        os.mkdir(root, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    import stat
+    st = os.lstat(root)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        return None
+    return root
+
+
+def reap_session_dirs(root):
+    """Remove session dirs whose owning shell process has exited.
+
+    Session dirs are named after the launcher's pid, which the shell keeps
+    when the launcher execs into it. No parent stays around to clean up, so
+    every launch sweeps the leftovers of sessions that have since ended.
+    """
+    import shutil
+    for name in os.listdir(root):
+        pid = name.split('-', 1)[0]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except PermissionError:
+            pass  # pid is alive (reused by another user)
+
+
+def make_session_dir():
+    """Create a private directory for the session's init files."""
+    import tempfile
+    root = _session_dirs_root()
+    if root is None:
+        return tempfile.mkdtemp(prefix='subshell-')
+    reap_session_dirs(root)
+    return tempfile.mkdtemp(prefix=f'{os.getpid()}-', dir=root)
+
+
+def write_activation_script(shell, dirname):
+    """Write the activation script for the given shell into dirname.
+
+    The launched shell sources this file directly, so activation does not
+    need a second interpreter start (`subshell activate`) for every session.
+    Returns the path of the written file.
+    """
+    path = os.path.join(dirname, f'activate.{shell}')
+    with open(path, "w") as f:
+        f.write(load_script(f'activate.{shell}'))
+    return path
+
+
+# Cached activate.zsh entries of other script versions are removed once this
+# old, so sessions started by an older launcher keep their file meanwhile. A
+# failed compile is remembered for as long before it is retried.
+ZSH_ACTIVATION_MAX_AGE = 24 * 3600.0
+
+
+def compiled_zsh_activation(cache_root, zsh='zsh'):
+    """Return the path of activate.zsh in a persistent cache, compiled to .zwc.
+
+    The file is named after a hash of the script's content, so a changed
+    script gets a fresh entry. `source` picks up the neighbouring .zwc (zsh
+    wordcode) automatically when it is newer than the script, which takes
+    parsing out of every shell start. Compiling needs one `zsh -c zcompile`
+    run per script version; when it fails, an `activate-<hash>.failed` marker
+    stops later launches from retrying it. Returns None when the cache cannot
+    be built; callers then fall back to the plain script.
+    """
+    import zlib
+    script = load_script('activate.zsh')
+    stem = f'activate-{zlib.crc32(script.encode()):08x}'
+    name = stem + '.zsh'
+    cache_dir = os.path.join(cache_root, 'zsh')
+    path = os.path.join(cache_dir, name)
+    if os.path.isfile(path + '.zwc'):
+        return path
+    failed = os.path.join(cache_dir, stem + '.failed')
+    try:
+        if time.time() - os.stat(failed).st_mtime < ZSH_ACTIVATION_MAX_AGE:
+            return None
+    except OSError:
+        pass
+
+    import subprocess
+    import tempfile
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+            # Compile under the final basename: zsh matches the .zwc by it
+            src = os.path.join(tmp, name)
+            with open(src, 'w') as f:
+                f.write(script)
+            try:
+                result = subprocess.run([zsh, '-fc', 'zcompile -- "$1"', 'zcompile', src],
+                                        stdin=subprocess.DEVNULL, capture_output=True)
+                error = result.stderr if result.returncode != 0 or not os.path.isfile(src + '.zwc') else None
+            except OSError as e:
+                error = str(e).encode()
+            if error is not None:
+                # Keep zsh's message for whoever finds the marker
+                with open(failed, 'wb') as f:
+                    f.write(error)
+                return None
+            # The wordcode is only used when strictly newer than the script
+            st = os.stat(src + '.zwc')
+            os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns - 1_000_000_000))
+            os.replace(src, path)
+            os.replace(src + '.zwc', path + '.zwc')
+        cutoff = time.time() - ZSH_ACTIVATION_MAX_AGE
+        for entry in os.listdir(cache_dir):
+            if entry.startswith('activate-') and not entry.startswith(stem + '.'):
+                entry_path = os.path.join(cache_dir, entry)
+                try:
+                    if os.stat(entry_path).st_mtime < cutoff:
+                        os.unlink(entry_path)
+                except OSError:
+                    pass
+    except OSError:
+        return None
+    return path
+
+
+########################
+### Starship config
+###
+# Starship has no include mechanism, so the indicator modules reach it as a
+# merged copy of the user's starship.toml plus the bundled starship.toml. The
+# launcher builds it once and names it after a hash of its content: every
+# session with the same inputs shares one file, and a changed user config or
+# module set gets a new one. Only the most recently used entries are kept.
+
+STARSHIP_CONFIG_KEEP = 8
+STARSHIP_MODULES = '$env_var.subshell_outside$env_var.subshell_inside '
+
+
+def _merge_starship_config(user_config: str, modules: str) -> str:
+    """Return user_config with the subshell modules defined and placed in its format.
+
+    A config that already references the modules keeps its format; one that
+    already defines them is not given a second definition. Otherwise the
+    modules go ahead of the first $all in the top-level format (or at its
+    start), and a config without a top-level format gets one.
+
+    Configs written for the earlier custom modules are migrated: their
+    $custom.subshell_* references point at the env_var modules instead, and
+    their [custom.subshell_*] tables are dropped, since $all (through
+    $custom) would otherwise still render them by running a shell.
+    """
+    import re
+    text = re.sub(r'(\$\{?)custom(\.subshell_(?:inside|outside)\b)', r'\1env_var\2', user_config)
+    text = re.sub(r'^[ \t]*\[custom\.subshell_(?:inside|outside)\][^\n]*\n(?:(?![ \t]*\[)[^\n]*(?:\n|$))*',
+                  '', text, flags=re.M)
+    if not re.search(r'\$\{?env_var\.subshell_(?:inside|outside)', text):
+        # Top-level keys come before the first table header
+        header = re.search(r'^[ \t]*\[', text, re.M)
+        head = text[:header.start()] if header else text
+        fmt = re.search(r'^[ \t]*format[ \t]*=[ \t]*("""|\'\'\'|"|\')', head, re.M)
+        if fmt:
+            end = head.find(fmt.group(1), fmt.end())
+            value = head[fmt.end():end if end >= 0 else len(head)]
+            at = value.find('$all')
+            at = fmt.end() + (at if at >= 0 else 0)
+            text = text[:at] + STARSHIP_MODULES + text[at:]
+        else:
+            text = f'format = "{STARSHIP_MODULES}$all"\n\n' + text
+    if re.search(r'^[ \t]*\[env_var\.subshell_(?:inside|outside)\]', text, re.M):
+        return text
+    if text and not text.endswith('\n'):
+        text += '\n'
+    return text + '\n# --- added by subshell ---\n' + modules
+
+
+def _evict_starship_configs(cache_dir: str, keep: int = STARSHIP_CONFIG_KEEP):
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.startswith('starship-') and entry.name.endswith('.toml'):
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+    for _, path in sorted(entries, reverse=True)[keep:]:
+        os.unlink(path)
+
+
+def _on_path(name: str, path: str) -> bool:
+    """True if an executable called name is in one of the directories of path.
+
+    `subshell activate` never touches session dirs, so unlike a launch it
+    does not import tempfile or shutil; a few stats keep it that way, where
+    shutil.which would pull in shutil (and with it bz2 and lzma).
+    """
+    for directory in path.split(os.pathsep):
+        candidate = os.path.join(directory or '.', name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return True
+    return False
 
-    def run(self, env=None):
-        subprocess.run(["fish", "--init-command", f"{__file__} activate fish | source"], env=env)
 
+def starship_config(env, cache_root):
+    """Return the path of the merged starship config for env, writing it if needed.
 
-class ZShell:
-    """Launch zsh with custom PS1"""
-    def run(self, env=None):
-        with TemporaryDirectory() as tmpdirname:
-            with open(os.path.join(tmpdirname, '.zshrc'), "w") as f:
-                f.write(self._custom_zshrc())
+    The user config is $STARSHIP_CONFIG, else starship.toml under
+    $XDG_CONFIG_HOME or ~/.config. A $STARSHIP_CONFIG that already points
+    into the cache (a nested session) is returned as is. Returns None when
+    the file cannot be written; the shell then keeps the user's config.
+    """
+    import zlib
+    cache_dir = os.path.join(cache_root, 'starship')
+    current = env.get('STARSHIP_CONFIG') or ''
+    if os.path.dirname(current) == cache_dir and os.path.isfile(current):
+        return current
+
+    user_config = ''
+    config_home = env.get('XDG_CONFIG_HOME')
+    candidates = [current,
+                  os.path.join(os.path.expanduser(config_home), 'starship.toml') if config_home else '',
+                  os.path.expanduser('~/.config/starship.toml')]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            with open(candidate, encoding='utf-8', errors='surrogateescape') as f:
+                user_config = f.read()
+            break
+        except OSError:
+            continue
 
-            env_to_use = (env or os.environ.copy()).copy()
-            env_to_use['ZDOTDIR'] = tmpdirname
-            shell_path = env_to_use.get('SHELL', '/bin/zsh')
-            subprocess.run([shell_path], env=env_to_use)
+    data = _merge_starship_config(user_config, load_script('starship.toml')).encode('utf-8', 'surrogateescape')
+    path = os.path.join(cache_dir, f'starship-{zlib.crc32(data):08x}.toml')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                os.utime(path)  # mark as recently used
+                return path
+    except OSError:
+        pass
+    try:
+        _write_private_bytes(path, data)
+        _evict_starship_configs(cache_dir)
+    except OSError:
+        return None
+    return path
+
+
+class Shell:
+    """A shell the launcher starts with the subshell activation loaded.
+
+    Each session gets a private dir (see make_session_dir) for the files the
+    shell reads at startup. Subclasses set name and either define
+    argv(activate_path), the command line that sources the activation script,
+    or override command() when the shell needs more than that (zsh).
+    """
+    name = None
+    # Whether the activation script renders through starship when it finds it
+    starship = False
 
     def __str__(self):
-        return "zsh"
+        return self.name
+
+    def command(self, tmpdirname, env):
+        """Return (argv, env) that start the shell with activation sourced from tmpdirname."""
+        return self.argv(write_activation_script(self, tmpdirname)), env
+
+    def run(self, env=None, args=(), profile=None):
+        """Run the shell as a child with extra args and remove the session dir after."""
+        import shutil
+        import subprocess
+        tmpdirname = make_session_dir()
+        try:
+            argv, env = self.command(tmpdirname, env)
+            if profile: profile.mark('rc')
+            subprocess.run([*argv, *args], env=env)
+        finally:
+            shutil.rmtree(tmpdirname, ignore_errors=True)
 
-    def _custom_zshrc(self):
+    def exec(self, env=None):
+        """Replace the launcher with the shell; the session dir is reaped by a later launch."""
+        argv, env = self.command(make_session_dir(), env)
+        os.execvpe(argv[0], argv, env if env is not None else os.environ)
+
+
+class FishShell(Shell):
+    name = "fish"
+    starship = True
+
+    def export(self, name, value):
+        """A line that exports name=value when sourced."""
+        quoted = value.replace('\\', '\\\\').replace("'", "\\'")
+        return f"set -gx {name} '{quoted}'\n"
+
+    def argv(self, activate_path):
+        return ["fish", "--init-command", f"source '{activate_path}'"]
+
+
+class NuShell(Shell):
+    name = "nu"
+
+    def argv(self, activate_path):
+        # --execute runs after the user's config, then enters the REPL
+        return ["nu", "--execute", f"source '{activate_path}'"]
+
+
+class ZShell(Shell):
+    """Launch zsh with custom PS1; the generated .zshrc deletes its own session dir"""
+    name = "zsh"
+    starship = True
+
+    def export(self, name, value):
+        """A line that exports name=value when sourced."""
+        quoted = value.replace("'", "'\\''")
+        return f"export {name}='{quoted}'\n"
+
+    def command(self, tmpdirname, env):
+        """Return (argv, env) that start zsh with ZDOTDIR pointing at tmpdirname."""
+        env_to_use = (env or os.environ.copy()).copy()
+        shell_path = env_to_use.get('SHELL', '/bin/zsh')
+        activate_path = (compiled_zsh_activation(_resolve_cache_dir(env_to_use), shell_path)
+                         or write_activation_script(self, tmpdirname))
+        with open(os.path.join(tmpdirname, '.zshrc'), "w") as f:
+            f.write(self._custom_zshrc(activate_path, tmpdirname))
+
+        env_to_use['ZDOTDIR'] = tmpdirname
+        return [shell_path], env_to_use
+
+    def _custom_zshrc(self, activate_path, session_dir):
+        from textwrap import dedent
         current_zdotdir = os.environ.get('ZDOTDIR')
         current_rcpath = os.path.join(current_zdotdir if current_zdotdir else os.environ['HOME'], '.zshrc')
 
-        load_prevrc = f'source {current_rcpath}' if Path(current_rcpath).is_file() else '# No previous .zshrc to source'
+        load_prevrc = f'source {current_rcpath}' if os.path.isfile(current_rcpath) else '# No previous .zshrc to source'
 
+        # ZDOTDIR is restored before the user's rc runs: rc code reads it
+        # (${ZDOTDIR:-~}/.p10k.zsh) and p10k's instant prompt only replays a
+        # cache written under the same ZDOTDIR.
         return dedent(f"""
-        {load_prevrc}
-        eval "$({__file__} activate zsh)"
         {'ZDOTDIR=' + current_zdotdir if current_zdotdir else 'unset ZDOTDIR'}
+        {load_prevrc}
+        source '{activate_path}'
+        # Everything is loaded; remove the session dir without forking rm
+        zmodload -F zsh/files b:zf_rm 2>/dev/null && zf_rm -rf -- '{session_dir}'
         """)
         
 def detect_shell():
     shell_path = os.environ.get('SHELL', '/bin/bash')
-    shell_name = Path(shell_path).name
+    shell_name = os.path.basename(shell_path)
     
     if shell_name == "fish":
         return FishShell()
     elif shell_name == 'zsh':
         return ZShell()
+    elif shell_name == 'nu':
+        return NuShell()
     
 def get_shell_by_name(name: str):
     if not name:
@@ -233,6 +1196,8 @@ def get_shell_by_name(name: str):
         return FishShell()
     if name == 'zsh':
         return ZShell()
+    if name in ('nu', 'nushell'):
+        return NuShell()
     return None
 
 
@@ -240,25 +1205,63 @@ def get_shell_by_name(name: str):
 ### The Subshell app
 ###
 
+def seed_prompt_state(env: dict):
+    """Set an absolute SUBSHELL_ROOT and the starting SUBSHELL_OUTSIDE in env.
+
+    Prompt code that runs before the activation script, such as p10k's
+    instant prompt at the top of .zshrc, then shows the state the activated
+    shell will compute.
+    """
+    root = env.get('SUBSHELL_ROOT')
+    if not root:
+        env['SUBSHELL_OUTSIDE'] = '0'
+        return
+    root = os.path.realpath(os.path.expanduser(root))
+    cwd = os.path.realpath(os.getcwd())
+    inside = cwd == root or cwd.startswith(root.rstrip('/') + '/')
+    env['SUBSHELL_ROOT'] = root
+    env['SUBSHELL_OUTSIDE'] = '0' if inside else '1'
+
+
 def run_activate(shell_name):
     shell = get_shell_by_name(shell_name) if shell_name else detect_shell()
     if not shell:
-        print("No suitable shell found (fish or zsh).", file=sys.stderr)
+        print("No suitable shell found (fish, zsh or nu).", file=sys.stderr)
         return 1
     script = load_script(f'activate.{shell}')
+    # Sourced by hand (eval "$(subshell activate zsh)") rather than by a
+    # launched session, the script gets no merged starship config to point
+    # STARSHIP_CONFIG at; build it here and pass its path along
+    if (shell.starship and not os.environ.get('SUBSHELL_STARSHIP_CONFIG')
+            and not os.environ.get('SUBSHELL_NO_EPHEMERAL_STARSHIP')
+            and _on_path('starship', os.environ.get('PATH', ''))):
+        config = starship_config(os.environ, _resolve_cache_dir(os.environ))
+        if config:
+            script = shell.export('SUBSHELL_STARSHIP_CONFIG', config) + script
     # Print without adding an extra newline; fish snippet already ends with one
     print(script, end='' if script.endswith('\n') else '')
     return 0
 
 
-def run_launch():
+def run_launch(profile=None, wait=False, use_cache=True):
+    """Launch the detected shell with secrets merged into its environment.
+
+    By default the launcher execs into the shell so no Python process stays
+    resident for the life of the session. With wait=True it runs the shell as
+    a child and returns when it exits.
+
+    With a StartupProfile, the shell runs its full interactive init and then
+    exits immediately (`-i -c exit`) so every phase, including the shell's own
+    startup, is timed and reported.
+    """
     shell = detect_shell()
     if not shell:
-        print("No suitable shell found (fish or zsh).", file=sys.stderr)
+        print("No suitable shell found (fish, zsh or nu).", file=sys.stderr)
         return 1
     # Prepare environment with secrets (if any)
     base_env = os.environ.copy()
-    updates, errors = _load_secrets_from_root(base_env)
+    updates, errors = _load_secrets_from_root(base_env, use_cache=use_cache)
+    if profile: profile.mark('secrets')
     if errors:
         # Print prominently before launching the subshell. Use red color if supported.
         try:
@@ -267,40 +1270,80 @@ def run_launch():
         except Exception:
             red = reset = ""
         banner = (
-            "\n‼️  " + red + "subshell: one or more secret files were not found" + reset + " ‼️\n"
+            "\n‼️  " + red + "subshell: one or more secret sources could not be loaded" + reset + " ‼️\n"
             + "\n".join(f" - {e}" for e in errors) + "\n"
         )
         print(banner, file=sys.stderr)
 
     # Merge and launch
     base_env.update(updates)
-    shell.run(env=base_env)
+    seed_prompt_state(base_env)
+    # Only pay for merging and writing the config when the shell can use it
+    if not base_env.get('SUBSHELL_NO_EPHEMERAL_STARSHIP') and _on_path('starship', base_env.get('PATH', '')):
+        config = starship_config(base_env, _resolve_cache_dir(base_env))
+        if config:
+            base_env['SUBSHELL_STARSHIP_CONFIG'] = config
+    if profile:
+        shell.run(env=base_env, args=('-i', '-c', 'exit'), profile=profile)
+        profile.mark('spawn')
+        profile.report()
+    elif wait:
+        shell.run(env=base_env)
+    else:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        shell.exec(env=base_env)
     return 0
 
 
 ### argument parsing
 
 def commandline_parser():
+    import argparse
     parser = argparse.ArgumentParser(prog='subshell', add_help=True)
     # Global options (apply to default launch path as well)
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Time each launch phase (module, argparse, args, secrets, rc, spawn; plus interpreter CPU time) and exit after shell init')
+    parser.add_argument('--wait', action='store_true',
+                        help='Run the shell as a child process instead of exec-ing into it')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Resolve secrets from their sources without using or updating the cache')
     subparsers = parser.add_subparsers(dest='command')
 
-    # subshell activate [zsh|fish] [--prefix ...]
+    # subshell activate [zsh|fish|nu] [--prefix ...]
     p_act = subparsers.add_parser('activate', help='Print activation snippet for the given shell')
-    p_act.add_argument('shell', nargs='?', choices=['zsh', 'fish'], help='Shell to activate for (default: detect from $SHELL)')
+    p_act.add_argument('shell', nargs='?', choices=['zsh', 'fish', 'nu', 'nushell'], help='Shell to activate for (default: detect from $SHELL)')
     return parser
 
 
 ### entry point
 
 def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Fast paths for the common invocations: skip argparse entirely.
+    if not argv:
+        return run_launch()
+    if argv[0] == 'activate' and len(argv) <= 2 and argv[-1] in ('activate', 'zsh', 'fish', 'nu', 'nushell'):
+        return run_activate(argv[1] if len(argv) == 2 else None)
+
+    # _CPU_START: CPU time of interpreter startup (site, encodings, ...) up to our first line
+    profile = StartupProfile(_T_START, _CPU_START)
+    profile.mark('module')
+    import argparse  # noqa: F401 -- deferred; timed on its own, reused by commandline_parser
+    profile.mark('argparse')
     args = commandline_parser().parse_args(argv)
+    profile.mark('args')
 
     if args.command == 'activate':
         return run_activate(args.shell)
-    
+
+    elif args.profile_startup:
+        return run_launch(profile, use_cache=not args.no_cache)
+
     else:
-        return run_launch()
+        return run_launch(wait=args.wait, use_cache=not args.no_cache)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The launcher is a single script and the dev tools are plain scripts too;
+# make both importable by name.
+for path in (ROOT / 'src', ROOT / 'tools'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,41 @@
+"""Tokenizer work and error reporting of tools/ansi2txt.py.
+
+Throughput itself is measured by `tools/bench.py ansi2txt`; wall-clock
+assertions do not belong in a suite that runs on shared CI runners.
+"""
+import pytest
+
+import ansi2txt
+from bench import synthetic_recording
+
+
+class CountingPattern:
+    """Stands in for ansi2txt.tokenPattern, counting match() calls."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.calls = 0
+
+    def match(self, *args):
+        self.calls += 1
+        return self.pattern.match(*args)
+
+
+def test_one_match_per_token(monkeypatch):
+    # A regression to per-character scanning shows as many matches per token
+    counting = CountingPattern(ansi2txt.tokenPattern)
+    monkeypatch.setattr(ansi2txt, 'tokenPattern', counting)
+    data = synthetic_recording(0.2)
+    tokens = ansi2txt.parse(data)
+    assert counting.calls == len(tokens)
+    assert len(tokens) < len(data) / 4
+
+
+def test_text_runs_are_single_tokens():
+    tokens = ansi2txt.parse(b'\x1b[0m' + 'a\xe9'.encode() * 1000 + b'\r\n\x1b[1mxy')
+    assert [type(token).__name__ for token in tokens] == ['tuple', 'Text', 'tuple', 'Text']
+
+
+def test_unterminated_sequence_is_a_value_error():
+    with pytest.raises(ValueError):
+        ansi2txt.parse(b'ok\r\n\x1b]0;title')
@@ -0,0 +1,91 @@
+"""Upward .subshell discovery only trusts files and directories the user controls."""
+import os
+
+import pytest
+
+import subshell
+
+NOBODY = 65534
+
+
+@pytest.fixture
+def shared(tmp_path):
+    """tmp_path/shared/.subshell planting an exec: entry, and a repo below it."""
+    shared = tmp_path / 'shared'
+    repo = shared / 'work' / 'repo'
+    repo.mkdir(parents=True)
+    (shared / '.subshell').write_text(f'environment=exec:touch {tmp_path}/ran; echo PLANTED=1\n')
+    return shared
+
+
+def discover(repo):
+    env = {'PWD': str(repo), 'HOME': '/nonexistent', 'PATH': os.environ['PATH']}
+    updates, errors = subshell._load_secrets_from_root(env, use_cache=False)
+    return env.get('SUBSHELL_ROOT'), updates
+
+
+@pytest.mark.parametrize('mode', [0o755, 0o775])
+def test_own_ancestor_is_found(shared, mode, capsys):
+    shared.chmod(mode)
+    root, updates = discover(shared / 'work' / 'repo')
+    assert root == str(shared)
+    assert updates == {'PLANTED': '1'}
+    assert capsys.readouterr().err == ''
+
+
+def test_group_writable_subshell_file_is_used(shared):
+    # umask 002 checkouts
+    shared.chmod(0o775)
+    (shared / '.subshell').chmod(0o664)
+    assert discover(shared / 'work' / 'repo') == (str(shared), {'PLANTED': '1'})
+
+
+@pytest.mark.parametrize('mode', [0o777, 0o1777])
+def test_subshell_in_world_writable_directory_is_reported(shared, mode, capsys):
+    shared.chmod(mode)
+    assert discover(shared / 'work' / 'repo') == (None, {})
+    assert not (shared.parent / 'ran').exists()
+    assert capsys.readouterr().err == f'subshell: ignoring {shared}/.subshell: {shared} is world-writable\n'
+
+
+def test_walk_stops_at_world_writable_directory(shared, capsys):
+    (shared / '.subshell').unlink()
+    (shared / 'work').chmod(0o777)
+    (shared / '.subshell').write_text('environment=exec:echo ABOVE=1\n')
+    assert discover(shared / 'work' / 'repo') == (None, {})
+    assert capsys.readouterr().err == ''
+
+
+def test_world_writable_subshell_file_is_reported(shared, capsys):
+    shared.chmod(0o755)
+    (shared / '.subshell').chmod(0o666)
+    assert discover(shared / 'work' / 'repo') == (None, {})
+    assert capsys.readouterr().err == f'subshell: ignoring {shared}/.subshell: it is world-writable\n'
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason='needs root to chown')
+def test_subshell_owned_by_another_user_is_reported(shared, capsys):
+    shared.chmod(0o755)
+    os.chown(shared / '.subshell', NOBODY, NOBODY)
+    assert discover(shared / 'work' / 'repo') == (None, {})
+    assert not (shared.parent / 'ran').exists()
+    assert capsys.readouterr().err == f'subshell: ignoring {shared}/.subshell: it is owned by uid {NOBODY}\n'
+
+
+def test_walk_stops_at_directory_owned_by_another_user(shared, monkeypatch, capsys):
+    if os.geteuid() == 0:
+        os.chown(shared / 'work', NOBODY, NOBODY)
+    else:
+        # Everything on disk then belongs to "someone else"
+        monkeypatch.setattr(os, 'getuid', lambda: os.geteuid() + 1)
+    assert discover(shared / 'work' / 'repo') == (None, {})
+    assert not (shared.parent / 'ran').exists()
+    assert capsys.readouterr().err == ''
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason='needs root to own files as root')
+def test_root_owned_subshell_is_used(shared, monkeypatch):
+    # Seen by another user, the tree here belongs to root
+    shared.chmod(0o755)
+    monkeypatch.setattr(os, 'getuid', lambda: 1000)
+    assert discover(shared / 'work' / 'repo') == (str(shared), {'PLANTED': '1'})
@@ -0,0 +1,66 @@
+"""The dotenv parser, including its fast path for simple single-line entries."""
+import subshell
+
+
+def parse_file(tmp_path, text):
+    path = tmp_path / 'secrets.env'
+    path.write_bytes(text.encode())
+    return subshell._parse_dotenv_file(path)
+
+
+def test_simple_and_general_forms(tmp_path):
+    env, errors = parse_file(tmp_path, '\r\n'.join([
+        'PLAIN=value',
+        'export EXPORTED="with spaces"',
+        "SINGLE='$literal'",
+        'COMMENTED=value # note',
+        'HASH=a#b',
+        'ESCAPED="tab\\there \\$HOME"',
+        'MULTI="line one',
+        'line two"',
+        '# comment',
+        '',
+        'broken line',
+        'LAST=1',
+    ]))
+    assert env == {
+        'PLAIN': 'value',
+        'EXPORTED': 'with spaces',
+        'SINGLE': '$$literal',
+        'COMMENTED': 'value',
+        'HASH': 'a#b',
+        'ESCAPED': 'tab\there $$HOME',
+        'MULTI': 'line one\nline two',
+        'LAST': '1',
+    }
+    assert errors == [f'{tmp_path / "secrets.env"}:11: expected KEY=VALUE']
+
+
+def test_lines_across_read_blocks(tmp_path):
+    lines = [f'KEY_{i}="value {i}"' for i in range(20000)]
+    env, errors = parse_file(tmp_path, '\n'.join(lines))
+    assert len(env) == 20000 and env['KEY_19999'] == 'value 19999'
+    assert errors == []
+
+
+def test_unterminated_quote_does_not_swallow_later_keys(tmp_path):
+    env, errors = parse_file(tmp_path, '\n'.join([
+        'A=1',
+        "SINGLE='it is never closed",
+        'B="two"',
+        'DOUBLE="nor is this',
+        'C=3',
+    ]) + '\n')
+    assert env == {'A': '1', 'B': 'two', 'C': '3'}
+    path = tmp_path / 'secrets.env'
+    assert errors == [
+        f"{path}:2: unterminated ' quote for SINGLE, which is not set",
+        f'{path}:4: unterminated " quote for DOUBLE, which is not set',
+    ]
+
+
+def test_invalid_utf8_fails_the_file(tmp_path):
+    path = tmp_path / 'secrets.env'
+    path.write_bytes(b'A=1\nTOKEN=\xff\xfe\n')
+    assert subshell._parse_dotenv_file(path) == (
+        {}, [f'Secrets file {path} is not valid UTF-8; nothing was loaded from it'])
@@ -0,0 +1,69 @@
+"""Loading secrets from a project's .subshell file."""
+import subshell
+
+
+def write_subshell(root, *entries):
+    (root / '.subshell').write_text(''.join(f'environment={entry}\n' for entry in entries))
+
+
+def load(root, **env):
+    env = {'HOME': str(root), 'XDG_CONFIG_HOME': str(root / 'config'), 'PATH': '/usr/bin:/bin',
+           'SUBSHELL_ROOT': str(root), **env}
+    return subshell._load_secrets_from_root(env, use_cache=False)
+
+
+def test_exec_output_that_is_not_utf8_is_replaced(tmp_path):
+    write_subshell(tmp_path, r"exec:printf 'A=\377\nB=ok\n'")
+    updates, errors = load(tmp_path)
+    assert updates == {'A': '�', 'B': 'ok'}
+    assert errors == []
+
+
+def test_failing_exec_entry_is_reported_and_others_still_load(tmp_path, monkeypatch):
+    def boom(command, *args):
+        if command == 'explode':
+            raise RuntimeError('boom')
+        return {'B': command}, []
+    monkeypatch.setattr(subshell, '_run_env_command', boom)
+    write_subshell(tmp_path, 'exec:explode', 'exec:fine')
+    updates, errors = load(tmp_path)
+    assert updates == {'B': 'fine'}
+    assert errors == ["Secrets command failed (RuntimeError('boom')): explode"]
+
+
+def test_references_expand_in_dependency_order():
+    updates, errors = subshell._interpolate_env(
+        {'C': '${B}/c', 'B': '${A}/b', 'A': 'a', 'PATH': '${PATH}:/x', 'D': '${UNSET:-$$HOME}'},
+        {'PATH': '/bin'})
+    assert updates == {'C': 'a/b/c', 'B': 'a/b', 'A': 'a', 'PATH': '/bin:/x', 'D': '$HOME'}
+    assert errors == []
+
+
+def test_cycle_members_keep_their_unexpanded_value():
+    # A -> C -> B -> A is only found through B, which the walk reaches first from A
+    values = {'A': '${B}${C}', 'B': '${A}$$', 'C': '${B}', 'D': 'd-${A}', 'E': 'e'}
+    updates, errors = subshell._interpolate_env(values, {})
+    assert updates == {'A': '${B}${C}', 'B': '${A}$', 'C': '${B}', 'D': 'd-${B}${C}', 'E': 'e'}
+    assert len(errors) == 1 and errors[0].startswith('Circular reference: ')
+    assert set(errors[0].split(': ')[1].split(' -> ')) == {'A', 'B', 'C'}
+
+
+def test_unparsable_value_is_not_partially_expanded():
+    updates, errors = subshell._interpolate_env({'A': 'a', 'B': '${A} $$ ${A'}, {})
+    assert updates == {'A': 'a', 'B': '${A} $ ${A'}
+    assert errors == ["Cannot expand B: unterminated '${' in '${A} $$ ${A'"]
+
+
+def test_cache_follows_a_repointed_symlink(tmp_path):
+    (tmp_path / 'staging.env').write_text('STAGE=staging\n')
+    (tmp_path / 'prod.env').write_text('STAGE=prod\n')
+    (tmp_path / '.env').symlink_to('staging.env')
+    write_subshell(tmp_path, 'file:.env')
+    env = {'HOME': str(tmp_path), 'XDG_CONFIG_HOME': str(tmp_path / 'config'),
+           'XDG_CACHE_HOME': str(tmp_path / 'cache'), 'SUBSHELL_ROOT': str(tmp_path)}
+    assert subshell._load_secrets_from_root(dict(env)) == ({'STAGE': 'staging'}, [])
+    assert subshell._load_secrets_from_root(dict(env)) == ({'STAGE': 'staging'}, [])
+
+    (tmp_path / '.env').unlink()
+    (tmp_path / '.env').symlink_to('prod.env')
+    assert subshell._load_secrets_from_root(dict(env)) == ({'STAGE': 'prod'}, [])
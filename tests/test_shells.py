@@ -0,0 +1,52 @@
+"""Starting each shell with the activation script loaded."""
+import os
+
+import subshell
+
+
+def test_fish_and_nu_source_activation_from_the_session_dir(tmp_path):
+    for shell, flag in ((subshell.FishShell(), '--init-command'), (subshell.NuShell(), '--execute')):
+        env = {'HOME': str(tmp_path)}
+        argv, env_out = shell.command(str(tmp_path), env)
+        activate = tmp_path / f'activate.{shell}'
+        assert argv == [str(shell), flag, f"source '{activate}'"]
+        assert env_out is env
+        assert activate.read_text() == subshell.load_script(f'activate.{shell}')
+
+
+def test_zsh_gets_a_session_zdotdir(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.delenv('ZDOTDIR', raising=False)
+    session = tmp_path / 'session'
+    session.mkdir()
+    # zcompile cannot run, so the plain script is written to the session dir
+    env = {'SHELL': '/bin/false', 'XDG_CACHE_HOME': str(tmp_path / 'cache')}
+    argv, env_out = subshell.ZShell().command(str(session), env)
+    assert argv == ['/bin/false']
+    assert env_out['ZDOTDIR'] == str(session) and 'ZDOTDIR' not in env
+    zshrc = (session / '.zshrc').read_text()
+    assert 'unset ZDOTDIR' in zshrc
+    assert f"source '{session / 'activate.zsh'}'" in zshrc
+
+
+def test_run_removes_the_session_dir(tmp_path, monkeypatch):
+    session = tmp_path / 'session'
+    monkeypatch.setattr(subshell, 'make_session_dir', lambda: (session.mkdir(), str(session))[1])
+
+    class Probe(subshell.Shell):
+        name = 'fish'
+
+        def argv(self, activate_path):
+            return ['sh', '-c', f'test -f "{activate_path}" && touch "{tmp_path}/ran"']
+
+    Probe().run(env=dict(os.environ))
+    assert (tmp_path / 'ran').exists()
+    assert not session.exists()
+
+
+def test_nushell_alias_is_accepted(capsys):
+    script = subshell.load_script('activate.nu')
+    # Fast path, then through argparse
+    for argv in (['activate', 'nushell'], ['--no-cache', 'activate', 'nushell']):
+        assert subshell.main(argv) == 0
+        assert capsys.readouterr().out == script
@@ -0,0 +1,81 @@
+"""The merged starship config the launcher hands to the shell."""
+import subshell
+
+MODULES = subshell.load_script('starship.toml')
+
+OLD_CONFIG = '''format = """
+$custom.subshell_outside${custom.subshell_inside}
+$all"""
+
+[custom.subshell_inside]
+when = 'test -n "${SUBSHELL_PROMPT:-}"'
+command = 'printf %s "${SUBSHELL_PROMPT}"'
+
+[custom.subshell_outside]
+when = 'false'
+[custom.other]
+command = 'echo $custom.subshell_inside_not_ours'
+'''
+
+
+def test_modules_placed_ahead_of_all():
+    merged = subshell._merge_starship_config('format = "$directory$all"\n', MODULES)
+    assert merged.startswith(f'format = "$directory{subshell.STARSHIP_MODULES}$all"\n')
+    assert merged.count('[env_var.subshell_inside]') == 1
+
+
+def test_custom_module_config_is_migrated():
+    merged = subshell._merge_starship_config(OLD_CONFIG, MODULES)
+    assert merged.startswith('format = """\n$env_var.subshell_outside${env_var.subshell_inside}\n$all"""')
+    assert '[custom.subshell_' not in merged and 'printf' not in merged
+    assert "[custom.other]\ncommand = 'echo $custom.subshell_inside_not_ours'\n" in merged
+    assert merged.count('[env_var.subshell_inside]') == 1
+
+
+def test_user_env_var_modules_are_kept():
+    config = 'format = "$env_var.subshell_inside$all"\n[env_var.subshell_inside]\nvariable = "X"\n'
+    assert subshell._merge_starship_config(config, MODULES) == config
+
+
+def test_on_path(tmp_path):
+    (tmp_path / 'starship').write_text('#!/bin/sh\n')
+    assert not subshell._on_path('starship', str(tmp_path))
+    (tmp_path / 'starship').chmod(0o755)
+    assert subshell._on_path('starship', f'/nonexistent:{tmp_path}')
+
+
+def activate(shell, tmp_path, monkeypatch, capsys, **env):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir(exist_ok=True)
+    (bin_dir / 'starship').write_text('#!/bin/sh\n')
+    (bin_dir / 'starship').chmod(0o755)
+    monkeypatch.delenv('SUBSHELL_STARSHIP_CONFIG', raising=False)
+    monkeypatch.delenv('SUBSHELL_NO_EPHEMERAL_STARSHIP', raising=False)
+    monkeypatch.delenv('STARSHIP_CONFIG', raising=False)
+    monkeypatch.setenv('PATH', str(bin_dir))
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'config'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / "it's cache"))
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    assert subshell.main(['activate', shell]) == 0
+    return capsys.readouterr().out
+
+
+def test_manual_activation_passes_a_merged_config(tmp_path, monkeypatch, capsys):
+    config_dir = tmp_path / "it's cache" / 'subshell' / 'starship'
+    out = activate('zsh', tmp_path, monkeypatch, capsys)
+    [config] = config_dir.glob('starship-*.toml')
+    quoted = str(config).replace("'", "'\\''")
+    assert out.startswith(f"export SUBSHELL_STARSHIP_CONFIG='{quoted}'\n")
+    assert '[env_var.subshell_inside]' in config.read_text()
+
+    out = activate('fish', tmp_path, monkeypatch, capsys)
+    assert out.startswith(f"set -gx SUBSHELL_STARSHIP_CONFIG '{str(config)}'\n".replace("it's", "it\\'s"))
+
+
+def test_launched_session_activation_keeps_the_launcher_config(tmp_path, monkeypatch, capsys):
+    out = activate('zsh', tmp_path, monkeypatch, capsys, SUBSHELL_STARSHIP_CONFIG='/launcher.toml')
+    assert out == subshell.load_script('activate.zsh')
+    out = activate('nu', tmp_path, monkeypatch, capsys)
+    assert out == subshell.load_script('activate.nu')
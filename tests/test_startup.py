@@ -0,0 +1,42 @@
+"""Import cost of the launcher: every session pays it before the shell starts."""
+import io
+import statistics
+
+import pytest
+
+import subshell
+from bench import IMPORT_BUDGET_MS, LAUNCHER, LAZY_MODULES, compile_launcher, imported_modules
+
+RUNS = 5
+
+
+@pytest.fixture(scope='module', autouse=True)
+def bytecode():
+    """The budget is for a warm import (see bench.IMPORT_BUDGET_MS)."""
+    compile_launcher()
+
+
+def test_import_loads_no_deferred_modules():
+    baseline = imported_modules('pass')
+    added = imported_modules(f'import {LAUNCHER.stem}').keys() - baseline.keys()
+    assert not LAZY_MODULES & added, f'imported at module load: {sorted(LAZY_MODULES & added)}'
+
+
+def test_import_within_budget():
+    baseline = imported_modules('pass')
+    samples = []
+    for _ in range(RUNS):
+        modules = imported_modules(f'import {LAUNCHER.stem}')
+        samples.append(sum(us for name, us in modules.items() if name not in baseline) / 1000)
+    cost = statistics.median(samples)
+    assert cost <= IMPORT_BUDGET_MS, f'import costs {cost:.2f} ms, budget {IMPORT_BUDGET_MS} ms'
+
+
+def test_profile_total_is_wall_time_only():
+    profile = subshell.StartupProfile(0.0, interpreter_cpu=0.5)
+    profile.phases = [('module', 0.001), ('args', 0.002)]
+    out = io.StringIO()
+    profile.report(file=out)
+    lines = out.getvalue().splitlines()
+    assert lines[2] == f"{'total':<12} {3.0:8.2f} ms wall"
+    assert lines[3].startswith(f"{'interpreter':<12} {500.0:8.2f} ms CPU")
@@ -0,0 +1,30 @@
+"""Driving a program in a pty with tools/termrec.py."""
+import asyncio
+
+import pytest
+
+from termrec import terminal
+
+
+def run(command, **options):
+    async def session():
+        async with terminal(command, **options) as term:
+            assert await term.waitForOutput(b'done')
+            return term.output(), term
+    return asyncio.run(session())
+
+
+def test_emulation_is_opt_in():
+    output, term = run(['sh', '-c', 'printf "hello done"; exec sleep 5'])
+    assert output == b'hello done'
+    with pytest.raises(RuntimeError):
+        term.screen()
+
+
+def test_emulation_stops_at_the_first_error(capfd):
+    # \377 is not UTF-8: the emulator fails on it, the recording goes on
+    script = r'printf "ok\n"; sleep 0.2; printf "bad \377\n"; sleep 0.2; printf "more\n"; sleep 0.2; printf done; exec sleep 5'
+    output, term = run(['sh', '-c', script], emulate=True)
+    assert output == b'ok\r\nbad \xff\r\nmore\r\ndone'
+    assert term.text().strip() == 'ok'
+    assert capfd.readouterr().err.count('termrec: terminal emulation stopped') == 1
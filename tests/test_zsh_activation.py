@@ -0,0 +1,52 @@
+"""The compiled activate.zsh cache."""
+import os
+import time
+
+import subshell
+
+
+def fake_zsh(tmp_path, body):
+    """A stand-in for zsh invoked as `zsh -fc 'zcompile -- "$1"' zcompile FILE`."""
+    path = tmp_path / 'zsh'
+    path.write_text(f'#!/bin/sh\necho run >> "{tmp_path}/runs"\n{body}\n')
+    path.chmod(0o755)
+    return str(path)
+
+
+def runs(tmp_path):
+    path = tmp_path / 'runs'
+    return len(path.read_text().splitlines()) if path.exists() else 0
+
+
+def test_failed_compile_is_remembered(tmp_path):
+    zsh = fake_zsh(tmp_path, 'echo "zcompile: broken" >&2; exit 1')
+    cache = tmp_path / 'cache'
+    assert subshell.compiled_zsh_activation(str(cache), zsh) is None
+    assert subshell.compiled_zsh_activation(str(cache), zsh) is None
+    assert runs(tmp_path) == 1
+    [marker] = (cache / 'zsh').glob('activate-*.failed')
+    assert marker.read_bytes() == b'zcompile: broken\n'
+
+    # Retried once the marker is old
+    old = time.time() - subshell.ZSH_ACTIVATION_MAX_AGE - 60
+    os.utime(marker, (old, old))
+    assert subshell.compiled_zsh_activation(str(cache), zsh) is None
+    assert runs(tmp_path) == 2
+
+
+def test_only_old_entries_of_other_versions_are_pruned(tmp_path):
+    zsh = fake_zsh(tmp_path, 'touch "$4.zwc"')
+    cache_dir = tmp_path / 'cache' / 'zsh'
+    cache_dir.mkdir(parents=True)
+    old = time.time() - subshell.ZSH_ACTIVATION_MAX_AGE - 60
+    for entry in ('activate-00000000.zsh', 'activate-00000000.zsh.zwc', 'activate-00000001.failed'):
+        (cache_dir / entry).touch()
+        os.utime(cache_dir / entry, (old, old))
+    (cache_dir / 'activate-00000002.zsh').touch()
+
+    path = subshell.compiled_zsh_activation(str(tmp_path / 'cache'), zsh)
+    assert path and os.path.isfile(path + '.zwc')
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        ['activate-00000002.zsh', os.path.basename(path), os.path.basename(path) + '.zwc'])
+    assert subshell.compiled_zsh_activation(str(tmp_path / 'cache'), zsh) == path
+    assert runs(tmp_path) == 1
@@ -0,0 +1,13 @@
+"""The generic zsh prompt path must not fork: every prompt would pay for it."""
+import shutil
+
+import pytest
+
+from bench import zsh_forks
+
+PROMPTS = 20
+
+
+@pytest.mark.skipif(not shutil.which('zsh') or not shutil.which('strace'), reason='needs zsh and strace')
+def test_precmd_does_not_fork():
+    assert zsh_forks('zsh', PROMPTS) == 0
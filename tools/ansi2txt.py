@@ -1,4 +1,7 @@
+import functools
+import re
 import sys
+from array import array
 
 
 class Text:
@@ -39,167 +42,128 @@ sgrColors = {
     7: 'white',
 }
 
-def CSI(params: list[int]):
-    [*ps, final] = params
-
-    if False: pass
-
-    elif final == 0x41:
-        x = bytes(ps).decode('utf-8')
-        if x == '':
-            return ('cursor up', 1)
-        else:
-            return ('cursor up', int(x))
-
-    elif final == 0x42:
-        x = bytes(ps).decode('utf-8')
-        if x == '':
-            return ('cursor down', 1)
-        else:
-            return ('cursor down', int(x))
-
-    elif final == 0x43:
-        x = bytes(ps).decode('utf-8')
-        if x == '':
-            return ('cursor forward', 1)
-        else:
-            return ('cursor forward', int(x))
-
-    elif final == 0x44:
-        x = bytes(ps).decode('utf-8')
+# CSI handlers, keyed by final byte; each takes the decoded parameter string.
+
+def _csiCount(name: str):
+    def handler(x: str):
+        return (name, int(x) if x else 1)
+    return handler
+
+def _csiCursorPosition(x: str):
+    xs = x.split(';')
+    if xs == ['']:
+        return ('cursor position', 1, 1)
+    elif len(xs) == 2:
+        row = int(xs[0]) if xs[0] != '' else 1
+        col = int(xs[1]) if xs[1] != '' else 1
+        return ('cursor position', row, col)
+    raise ValueError('Grokking', x)
+
+eraseScreenModes = {'': 'to end', '0': 'to end', '1': 'to start', '2': 'to all', '3': 'to all and scrollback'}
+eraseLineModes = {'': 'to end', '0': 'to end', '1': 'to start', '2': 'to all'}
+
+def _csiEraseScreen(x: str):
+    if x not in eraseScreenModes:
+        raise ValueError('Grokking', x)
+    return ('CSI', 'erase screen', eraseScreenModes[x])
+
+def _csiEraseLine(x: str):
+    if x not in eraseLineModes:
+        raise ValueError('Grokking', x)
+    return ('CSI', 'erase line', eraseLineModes[x])
+
+def _csiSetMode(x: str):  # 'h' SM
+    if x.startswith('?'):
+        n = int(x[1:])
+        if n not in modes:
+            raise ValueError('Grokking', x)
+        return ('CSI', 'SM', 'DEC Private Mode', modes[n])
+    raise ValueError('Grokking', x)
+
+def _csiResetMode(x: str):  # 'l' RM
+    if x.startswith('?'):
+        return ('CSI', 'RM', 'DEC Private Mode', modes[int(x[1:])])
+    raise ValueError('Grokking', x)
+
+def _sgrExtendedColor(kind: str, xs, x: str):
+    pcount = next(xs)
+    if pcount == '2':
+        return (kind, (next(xs), next(xs), next(xs)))
+    elif pcount == '5':
+        return (kind, next(xs))
+    raise ValueError('Grokking', x, pcount)
+
+def _csiSGR(x: str):  # 'm' SGR
+    xs = iter(x.split(';'))
+    bits = []
+    for x in xs:
         if x == '':
-            return ('cursor backward', 1)
-        else:
-            return ('cursor backward', int(x))
-        
-    elif final == 0x48:
-        x = bytes(ps).decode('utf-8').split(';')
-        if x == ['']:
-            return ('cursor position', 1, 1)
-        elif len(x) == 2:
-            row = int(x[0]) if x[0] != '' else 1
-            col = int(x[1]) if x[1] != '' else 1
-            return ('cursor position', row, col)
-        else:
-            raise ValueError('Grokking', ps, x)
-
-    elif final == 0x4a:
-        x = bytes(ps).decode('utf-8')
-        if x == '' or x == '0':
-            return ('CSI', 'erase screen', 'to end')
-        elif x == '1':
-            return ('CSI', 'erase screen', 'to start')
-        elif x == '2':
-            return ('CSI', 'erase screen', 'to all')
-        elif x == '3':
-            return ('CSI', 'erase screen', 'to all and scrollback')
-        else:
-            raise ValueError('Grokking', ps, x)
-        
-    elif final == 0x4b:
-        x = bytes(ps).decode('utf-8')
-        if x == '' or x == '0':
-            return ('CSI', 'erase line', 'to end')
-        elif x == '1':
-            return ('CSI', 'erase line', 'to start')
-        elif x == '2':
-            return ('CSI', 'erase line', 'to all')
-        else:
-            raise ValueError('Grokking', ps, x)
-
-    elif final == 0x68:  # 'h' SM
-        x = bytes(ps).decode('utf-8')
-        if x.startswith('?'):
-            n = int(x[1:])
-            if n not in modes:
-                raise ValueError('Grokking', ps, x)
-            mode = modes[n]
-            return ('CSI', 'SM', 'DEC Private Mode', mode)
-        else:
-            raise ValueError('Grokking', ps, x)
-    if final == 0x6c:  # 'l' RM
-        x = bytes(ps).decode('utf-8')
-        if x.startswith('?'):
-            mode = modes[int(x[1:])]
-            return ('CSI', 'RM', 'DEC Private Mode', mode)
+            bits.append('reset')
+        elif x == '>4':
+            bits.append('xterm set key-modifier option')
+        elif len(x) == 1 or (len(x) == 2 and x.startswith('0')):
+            bits.append(('set', sgrAttributes[int(x)]))
+        elif x == '38':
+            bits.append(_sgrExtendedColor('true colour foreground', xs, x))
+        elif x == '39':
+            bits.append('default foreground')
+        elif x == '48':
+            bits.append(_sgrExtendedColor('true colour background', xs, x))
+        elif x == '49':
+            bits.append('default background')
         else:
-            raise ValueError('Grokking', ps, x)
+            n = int(x)
+            if 20 <= n <= 29:
+                bits.append(('cancel', sgrAttributes[n % 10]))
+            elif 30 <= n <= 37:
+                bits.append(('foreground', sgrColors[n % 10]))
+            elif 40 <= n <= 47:
+                bits.append(('background', sgrColors[n % 10]))
+            elif 90 <= n <= 97:
+                bits.append(('bright foreground', sgrColors[n % 10]))
+            elif 100 <= n <= 107:
+                bits.append(('bright background', sgrColors[n % 10]))
+            else:
+                raise ValueError('Grokking', x)
+    return ('CSI', 'SGR', bits)
+
+csiU = {
+    '': ('CSI', 'save cursor'),
+    '=0': ('CSI', 'keyboard transmit mode [linux]', 'normal'),
+    '=1': ('CSI', 'keyboard transmit mode [linux]', 'application'),
+    '=2': ('CSI', 'keyboard transmit mode [linux]', 'vt'),
+    '=5': ('CSI', 'set F5 string'),
+}
 
-    elif final == 0x6d:  # 'm' SGR
-        xs = bytes(ps).decode('utf-8').split(';')
-        bits = []
-        if not xs:
-            bits.append('reset')
+def _csiU(x: str):
+    if x not in csiU:
+        raise ValueError(f'Unexpected CSI u params: {x}')
+    return csiU[x]
+
+csiHandlers = {
+    0x41: _csiCount('cursor up'),        # A
+    0x42: _csiCount('cursor down'),      # B
+    0x43: _csiCount('cursor forward'),   # C
+    0x44: _csiCount('cursor backward'),  # D
+    0x48: _csiCursorPosition,            # H
+    0x4a: _csiEraseScreen,               # J
+    0x4b: _csiEraseLine,                 # K
+    0x68: _csiSetMode,                   # h
+    0x6c: _csiResetMode,                 # l
+    0x6d: _csiSGR,                       # m
+    0x75: _csiU,                         # u
+}
 
-        while xs:
-            x = xs.pop(0)
-            if x == '':
-                bits.append('reset')
-            elif x == '>4':
-                bits.append('xterm set key-modifier option')
-            elif len(x) == 1 or (len(x) == 2 and x.startswith('0')):
-                attribute = sgrAttributes[int(x)]
-                bits.append(('set', attribute))
-            elif int(x) >= 20 and int(x) <= 29:
-                attribute = sgrAttributes[int(x) % 10]
-                bits.append(('cancel', attribute))
-            elif int(x) >= 30 and int(x) <= 37:
-                bits.append(('foreground', sgrColors[int(x) % 10]))
-            elif x == '38':
-                pcount = xs.pop(0)
-                if pcount == '2':
-                    r = xs.pop(0)
-                    g = xs.pop(0)
-                    b = xs.pop(0)
-                    bits.append(('true colour foreground', (r,g,b)))
-                elif pcount == '5':
-                    index = xs.pop(0)
-                    bits.append(('true colour foreground', index))
-                else:
-                    raise ValueError('Grokking', ps, x, pcount)
-            elif x == '39':
-                bits.append('default foreground')
-            elif int(x) >= 40 and int(x) <= 47:
-                bits.append((f'background', sgrColors[int(x) % 10]))
-            elif x == '48':
-                pcount = xs.pop(0)
-                if pcount == '2':
-                    r = xs.pop(0)
-                    g = xs.pop(0)
-                    b = xs.pop(0)
-                    bits.append(('true colour background', (r,g,b)))
-                elif pcount == '5':
-                    index = xs.pop(0)
-                    bits.append(('true colour background', index))
-                else:
-                    raise ValueError('Grokking', ps, x, pcount)
-            elif x == '49':
-                bits.append('default background')
-            elif int(x) >= 90 and int(x) <= 97:
-                bits.append(('bright foreground', sgrColors[int(x) % 10]))
-            elif int(x) >= 100 and int(x) <= 107:
-                bits.append(('bright background', sgrColors[int(x) % 10]))
-            else:
-                raise ValueError('Grokking', ps, x)
-        return ('CSI', 'SGR', bits)
-        
-    elif final == 0x75:
-        x = bytes(ps).decode('utf-8')
-        if x == '':
-            return ('CSI', 'save cursor')
-        elif x == '=0':
-            return ('CSI', 'keyboard transmit mode [linux]', 'normal')
-        elif x == '=1':
-            return ('CSI', 'keyboard transmit mode [linux]', 'application')
-        elif x == '=2':
-            return ('CSI', 'keyboard transmit mode [linux]', 'vt')
-        elif x == '=5':
-            return ('CSI', 'set F5 string')
-        raise ValueError(f'Unexpected CSI u params: {ps}', x)
-        
-    raise ValueError(f'Unexpected CSI final: {final:02x}')
+@functools.lru_cache(maxsize=4096)
+def CSI(params: bytes, final: int):
+    """Decode one CSI sequence. Recordings repeat the same few sequences, so
+    results are cached; callers must not mutate them."""
+    handler = csiHandlers.get(final)
+    if handler is None:
+        raise ValueError(f'Unexpected CSI final: {final:02x}')
+    return handler(params.decode('utf-8'))
 
-def OSC(params: list[int]):
+def OSC(params: bytes):
     x = bytes(params).decode('utf-8')
     [ps, *pt] = x.split(';')
 
@@ -221,228 +185,377 @@ def G(n: int):
 def KeypadMode(mode: str):
     return f'KeypadMode({mode})'
 
+charsets = {
+    0x42: G(0),  # ASCII
+    0x4d: G(1),  # DEC Special Character and Line Drawing Set
+}
+
+# One match per token: a run of text or an escape sequence. CSI parameters
+# run up to a final byte in 0x40-0x7e; OSC runs up to BEL or ST (ESC \),
+# and the terminator stays part of its payload.
+tokenPattern = re.compile(rb"""
+    (?P<text>[^\x1b]+)
+  | \x1b(?:
+        \[ (?P<csi>[^\x40-\x7e]*) (?P<final>[\x40-\x7e])
+      | \] (?P<osc>.*?(?:\x07|\x1b\\))
+      | \( (?P<charset>.)
+      | (?P<keypad>[=>])
+      | (?P<esc>[^\[\]\(])
+    )
+""", re.S | re.X)
+
+def _charset(m):
+    p = m.group('charset')[0]
+    if p not in charsets:
+        raise ValueError(f'Unexpected byte after ESC (: {p:02x}')
+    return charsets[p]
+
+def _unexpectedEscape(m):
+    raise ValueError(f'Unexpected byte after ESC: {m.group("esc")[0]:02x}')
+
+# Token constructors, keyed by the name of the last group the match set
+tokenHandlers = {
+    'text': lambda m: Text(m.group('text').decode('utf-8')),
+    'final': lambda m: CSI(m.group('csi'), m.group('final')[0]),
+    'osc': lambda m: OSC(m.group('osc')),
+    'charset': _charset,
+    'keypad': lambda m: KeypadMode('application' if m.group('keypad') == b'=' else 'numeric'),
+    'esc': _unexpectedEscape,
+}
+
+def position(data, start: int, end: int, offset: int = 0, line: int = 1):
+    """Describe the bytes data[start:end] for error messages.
+
+    offset and line locate data within a longer stream; the column is only
+    known once a newline has been seen in data.
+    """
+    data = bytes(data)
+    newline = data.rfind(b'\n', 0, start)
+    line += data.count(b'\n', 0, start)
+    col = f'col {start - newline}, ' if newline >= 0 or not offset else ''
+    text = data[start:end].decode('utf-8', errors='replace').replace('\x1b', '<ESC>')
+    return f'line {line}, {col}byte {offset + start}, text {text!r}'
+
+def tokenize(data):
+    """Lazily yield the tokens of an ANSI byte stream (bytes, bytearray or memoryview).
+
+    Positions are only worked out when a sequence fails to parse.
+    """
+    match = tokenPattern.match
+    handlers = tokenHandlers
+    pos = 0
+    end = len(data)
+    while pos < end:
+        m = match(data, pos)
+        try:
+            if m is None:
+                raise ValueError('Unterminated escape sequence')
+            token = handlers[m.lastgroup](m)
+        except Exception:
+            print(f'Error parsing at {position(data, pos, m.end() if m else end)}', file=sys.stderr)
+            raise
+        yield token
+        pos = m.end()
 
 def parse(inputBytes):
-    inputBytes = list(reversed(inputBytes)) # pop(0) could be used instead
-    blocks = []
-    def emit(block):
-        blocks.append(block)
-        # print(block)
-
-    ofs = 0
-    line = 1
-    col = 1
-    consumed = []
-    originalInput = list(reversed(inputBytes))
-    def consume():
-        b = inputBytes.pop()
-        nonlocal ofs, line, col
-        ofs += 1
-        if b == 10:  # \n
-            line += 1
-            col = 1
-        else: col += 1
-        consumed.append(b)
-        return b
-
-    checkpoint_ofs = 0
-    checkpoint_line = 1
-    checkpoint_col = 1
-    def checkpoint():
-        nonlocal checkpoint_ofs, checkpoint_line, checkpoint_col
-        checkpoint_ofs = ofs
-        checkpoint_line = line
-        checkpoint_col = col
-
-    def position():
-        return f'line {line}, col {col}, byte {ofs}, from {checkpoint_ofs} (line {checkpoint_line}, col {checkpoint_col}), text {bytes(originalInput[checkpoint_ofs:ofs]).decode("utf-8", errors="replace").replace('\x1b', '<ESC>')!r}'
-
-    while inputBytes:
-        checkpoint()
-        b = consume()
-
-        if b == 0x1b:
-            try:
-                e = consume()
-
-                if e == 0x5b:
-                    csi = []
-                    while True:
-                        c = consume()
-                        csi.append(c)
-                        if 0x40 <= c <= 0x7e:
-                            break
-
-                    emit(CSI(csi))
-
-                elif e == 0x5d:
-                    # OSC (Operating System Command)
-                    osc = []
-                    while True:
-                        c = consume()
-                        osc.append(c)
-                        if c == 0x07:  # BEL
-                            break
-                        if len(osc) >= 2 and osc[-2] == 0x1b and osc[-1] == 0x5c:  # ST
-                            break
-                    emit(OSC(osc))
-
-                elif e == 0x28:
-                    p = consume()
-                    if p == 0x42:
-                        emit(G(0))  # ASCII
-                    elif p == 0x4d:
-                        emit(G(1))  # DEC Special Character and Line Drawing Set
-                    else:
-                        raise ValueError(f'Unexpected byte after ESC (: {p:02x}')
-                    
-                elif e == 0x3d:
-                    emit(KeypadMode('application'))
-
-                elif e == 0x3e:
-                    emit(KeypadMode('numeric'))
-
-                else:
-                    raise ValueError(f'Unexpected byte after ESC: {e:02x}')
-            except:
-                print(f'Error parsing at {position()}', file=sys.stderr)
-                raise
-        else:
-            text = [b]
-            while inputBytes and inputBytes[-1] != 0x1b:
-                text.append(consume())
-            emit(Text(bytearray(text).decode('utf-8')))
+    return list(tokenize(inputBytes))
+
+def _partialUTF8(data, end: int) -> int:
+    """Number of bytes at data[:end] that start a UTF-8 character the data cuts off."""
+    for n in range(1, min(4, end + 1)):
+        byte = data[end - n]
+        if byte & 0xc0 != 0x80:  # not a continuation byte: the lead byte
+            need = 2 if byte < 0xe0 else 3 if byte < 0xf0 else 4
+            return n if byte >= 0xc0 and need > n else 0
+    return 0
 
+class TokenStream:
+    """Incremental tokenize(): feed() chunks as they arrive and get back the
+    tokens they complete.
 
-    return blocks
+    An escape sequence or UTF-8 character split across chunks is held back
+    until the rest of it arrives; close() fails on anything left unfinished.
+    """
+    __slots__ = ('pending', 'offset', 'line')
+
+    # An escape sequence still open after this many bytes is malformed
+    maxPending = 1 << 16
 
-class Pos:
     def __init__(self):
+        self.pending = b''
+        self.offset = 0
+        self.line = 1
+
+    def feed(self, chunk) -> list:
+        data = self.pending + chunk if self.pending else chunk
+        tokens = []
+        append = tokens.append
+        match = tokenPattern.match
+        handlers = tokenHandlers
+        pos = 0
+        end = len(data)
+        while pos < end:
+            m = match(data, pos)
+            if m is None:
+                break  # an escape sequence the next chunk completes
+            try:
+                if m.lastgroup == 'text' and m.end() == end:
+                    cut = end - _partialUTF8(data, end)
+                    if cut > pos:
+                        append(Text(bytes(data[pos:cut]).decode('utf-8')))
+                    pos = cut
+                    break
+                append(handlers[m.lastgroup](m))
+            except Exception:
+                print(f'Error parsing at {position(data, pos, m.end(), self.offset, self.line)}', file=sys.stderr)
+                raise
+            pos = m.end()
+        self.pending = bytes(data[pos:])
+        self.offset += pos
+        self.line += data.count(b'\n', 0, pos)
+        if len(self.pending) > self.maxPending:
+            print(f'Error parsing at {position(self.pending, 0, 32, self.offset, self.line)}', file=sys.stderr)
+            raise ValueError('Unterminated escape sequence')
+        return tokens
+
+    def close(self) -> list:
+        """Tokens of whatever is still held back; raises if it is incomplete."""
+        data, self.pending = self.pending, b''
+        return parse(data)
+
+# Cells are stored as codepoints in arrays; encoding a run of text as UTF-32
+# in native byte order gives the array contents directly.
+_UTF32 = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+# Codepoint 0 is the empty cell every row starts with; it renders as ''
+EMPTY = 0
+SPACE = 0x20
+_controls = re.compile(r'[\n\r\t\b]')
+
+class Screen:
+    """Terminal screen as rows of codepoint arrays plus parallel style-ID arrays.
+
+    A style is an interned (foreground, background, attributes) tuple, so a
+    cell costs two array slots and every cell written under the same SGR
+    state shares one immutable style. The cursor is 1-based.
+
+    With scrollback set, at most that many rows are kept: rows beyond it are
+    evicted from the top (counted in evicted), and cursor positions address
+    the rows still kept.
+    """
+    __slots__ = ('chars', 'styleIds', 'styles', 'styleIndex', 'row', 'col', 'scrollback', 'evicted')
+
+    def __init__(self, scrollback=None):
+        self.chars = [array('I', [EMPTY])]
+        self.styleIds = [array('I', [0])]
+        self.styles = [(None, None, frozenset())]
+        self.styleIndex = {self.styles[0]: 0}
         self.row = 1
         self.col = 1
-
-class Char:
-    def __init__(self, char: str, foreground = None, background = None, attributes = None):
-        self.char = char
-        self.foreground = foreground
-        self.background = background
-        self.attributes = attributes or set()
-
-    def __repr__(self):
-        if not self.char:
-            return '(nil)'
-        if self.char and self.char[0] < ' ':
-            return f'\\x{ord(self.char):02x}'
-        else:
-            return self.char
-
-def render(blocks):
-    p = Pos()
-
-    lines = [[Char('')]]
-    foreground = None
-    background = None
-    attributes = set()
-
-    def setCursor(row: int, col: int):
-        p.row = row
-        p.col = col
-        if p.row < 1: p.row = 1
-        if p.col < 1: p.col = 1
-        while len(lines) < p.row:
-            lines.append([Char('')])
-        while len(lines[p.row - 1]) < p.col:
-            lines[p.row - 1].append(Char(' '))
-
-    def addText(text: str):
-        for char in text:
+        self.scrollback = scrollback
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.chars)
+
+    def style(self, foreground, background, attributes):
+        """Return the ID of the interned style, adding it if new."""
+        key = (foreground, background, frozenset(attributes))
+        styleId = self.styleIndex.get(key)
+        if styleId is None:
+            styleId = self.styleIndex[key] = len(self.styles)
+            self.styles.append(key)
+        return styleId
+
+    def setCursor(self, row: int, col: int):
+        """Move the cursor, growing the screen so the cell under it exists."""
+        if row < 1: row = 1
+        if col < 1: col = 1
+        self.row = row
+        self.col = col
+        chars = self.chars
+        if len(chars) < row:
+            while len(chars) < row:
+                chars.append(array('I', [EMPTY]))
+                self.styleIds.append(array('I', [0]))
+            if self.scrollback and len(chars) > self.scrollback:
+                drop = len(chars) - self.scrollback
+                del chars[:drop]
+                del self.styleIds[:drop]
+                self.evicted += drop
+                row = self.row = row - drop
+        pad = col - len(chars[row - 1])
+        if pad > 0:
+            chars[row - 1].extend(array('I', [SPACE]) * pad)
+            self.styleIds[row - 1].extend(array('I', [0]) * pad)
+
+    def write(self, text: str, styleId: int):
+        """Write a run without control characters at the cursor and advance past it."""
+        start = self.col - 1
+        end = start + len(text)
+        # Grow to one past the run: the cursor cell always exists
+        self.col = end + 1
+        line = self.chars[self.row - 1]
+        ids = self.styleIds[self.row - 1]
+        pad = end + 1 - len(line)
+        if pad > 0:
+            line.extend(array('I', [SPACE]) * pad)
+            ids.extend(array('I', [0]) * pad)
+        line[start:end] = array('I', text.encode(_UTF32))
+        ids[start:end] = array('I', [styleId]) * len(text)
+
+    def addText(self, text: str, styleId: int):
+        if not _controls.search(text):
+            self.write(text, styleId)
+            return
+        pos = 0
+        for m in _controls.finditer(text):
+            if m.start() > pos:
+                self.write(text[pos:m.start()], styleId)
+            char = m.group()
             if char == '\n':
-                setCursor(p.row + 1, 1)
+                self.setCursor(self.row + 1, 1)
             elif char == '\r':
-                setCursor(p.row, 1)
+                self.setCursor(self.row, 1)
             elif char == '\t':
-                while (p.col - 1) % 8 != 7:
-                    addText(' ')
-            elif char == '\b':
-                setCursor(p.row, p.col - 1)
-            else:
-                setCursor(p.row, p.col + 1)
-                # we call setCursor first to make sure the buffers are big enough
-                # but then we have to subtract 2, 1 for the 1-based indexing and
-                # 1 for the fact that we already advanced the cursor
-                lines[p.row - 1][p.col - 2] = Char(char, foreground, background, attributes)
-
-    def eraseLineToEnd():
-        if p.row - 1 < len(lines):
-            lines[p.row - 1] = lines[p.row - 1][:p.col - 1]
-
-    def eraseScreenToEnd():
-        eraseLineToEnd()
-        del lines[p.row:]
-
-    def eraseScreen():
-        del lines[:]
-        lines.append([''])
-        setCursor(1, 1)
-
-    def handleSGR(bits):
-        nonlocal foreground, background, attributes
-        for bit in bits:
-            match bit:
-                case 'reset': 
-                    foreground = None
-                    background = None
-                    attributes.clear()
-                case ('set', 'reset'): 
-                    foreground = None
-                    background = None
-                    attributes.clear()
-                case 'default foreground': attributes.add('bright'); foreground = None
-                case 'default background': attributes.add('bright'); background = None
-                case ('true colour foreground', n): attributes.add('bright'); foreground = n
-                case ('foreground', color): attributes.discard('bright'); foreground = color
-                case ('background', color): attributes.discard('bright'); background = color
-                case ('bright foreground', color): attributes.add('bright'); foreground = color
-                case ('bright background', color): attributes.add('bright'); background = color
-                case ('set', attribute): attributes.add(attribute)
-                case ('cancel', attribute): attributes.discard(attribute)
-
-                case 'xterm set key-modifier option': pass
-                case _: raise ValueError('Grokking SGR bit', bit)
-
-    for block in blocks:
-        match block:
-            case ('icon', _): pass
-            case ('icon+title', _): pass
-            case ('title', _): pass
-            case ('CSI', 'RM', *_): pass
-            case ('CSI', 'SM', *_): pass
-            case ('CSI', 'SGR', bits): handleSGR(bits)
-            case ('CSI', 'keyboard transmit mode [linux]', *_): pass
-            case ('CSI', 'erase line', 'to end'): eraseLineToEnd()
-            case ('CSI', 'erase line', 'x'): pass
-            case ('CSI', 'erase screen', 'to end'): eraseScreenToEnd()
-            case ('CSI', 'erase screen', 'to all'): eraseScreen()
-            case ('CSI', 'erase screen', 'to all and scrollback'): eraseScreen()
-            case ('CSI', 'set F5 string', *_): pass
-            case ('cursor position', row, col): setCursor(row, col)
-            case ('cursor up', n): setCursor(p.row - n, p.col)
-            case ('cursor down', n): setCursor(p.row + n, p.col)
-            case ('cursor forward', n): setCursor(p.row, p.col + n)
-            case ('cursor backward', n): setCursor(p.row, p.col - n)
-            case ('cwd', *_): pass
-            case 'G(0)': pass
-            case 'KeypadMode(numeric)': pass
-            case 'KeypadMode(application)': pass
-            case Text(text):
-                addText(text)
-            case ('new-command and prompt-mode', _): pass
-            case ('end-prompt, start-input', _): pass
-            case ('end-input, start-output', _): pass
-            case ('end-current-command', _): pass
-            case _: raise NotImplementedError(block)
-    
-    return lines
+                # Pad with spaces until (col - 1) % 8 == 7
+                self.write(' ' * ((7 - (self.col - 1)) % 8), styleId)
+            else:  # '\b'
+                self.setCursor(self.row, self.col - 1)
+            pos = m.end()
+        if pos < len(text):
+            self.write(text[pos:], styleId)
+
+    def eraseLineToEnd(self):
+        if self.row - 1 < len(self.chars):
+            del self.chars[self.row - 1][self.col - 1:]
+            del self.styleIds[self.row - 1][self.col - 1:]
+
+    def eraseScreenToEnd(self):
+        self.eraseLineToEnd()
+        del self.chars[self.row:]
+        del self.styleIds[self.row:]
+
+    def eraseScreen(self):
+        self.chars[:] = [array('I', [EMPTY])]
+        self.styleIds[:] = [array('I', [0])]
+        self.setCursor(1, 1)
+
+    def line(self, row: int) -> str:
+        """Text of a 0-based row, without empty cells."""
+        return self.chars[row].tobytes().decode(_UTF32).replace('\0', '')
+
+    def cells(self, row: int):
+        """Yield (char, (foreground, background, attributes)) for each cell of a 0-based row."""
+        styles = self.styles
+        for code, styleId in zip(self.chars[row], self.styleIds[row]):
+            yield (chr(code) if code else ''), styles[styleId]
+
+def applySGR(style, bits):
+    """Return the (foreground, background, attributes) that SGR bits turn style into."""
+    foreground, background, attributes = style
+    attributes = set(attributes)
+    for bit in bits:
+        match bit:
+            case 'reset': 
+                foreground = None
+                background = None
+                attributes.clear()
+            case ('set', 'reset'): 
+                foreground = None
+                background = None
+                attributes.clear()
+            case 'default foreground': attributes.add('bright'); foreground = None
+            case 'default background': attributes.add('bright'); background = None
+            case ('true colour foreground', n): attributes.add('bright'); foreground = n
+            case ('foreground', color): attributes.discard('bright'); foreground = color
+            case ('background', color): attributes.discard('bright'); background = color
+            case ('bright foreground', color): attributes.add('bright'); foreground = color
+            case ('bright background', color): attributes.add('bright'); background = color
+            case ('set', attribute): attributes.add(attribute)
+            case ('cancel', attribute): attributes.discard(attribute)
+
+            case 'xterm set key-modifier option': pass
+            case _: raise ValueError('Grokking SGR bit', bit)
+    return foreground, background, attributes
+
+class Emulator:
+    """Incremental terminal emulator: feed() output chunks as they arrive and
+    query screen at any time.
+
+    Pass scrollback to bound the rows kept, so memory stays flat however
+    long the session runs.
+    """
+    __slots__ = ('tokens', 'screen', 'styleId', 'transitions')
+
+    def __init__(self, scrollback=None):
+        self.tokens = TokenStream()
+        self.screen = Screen(scrollback)
+        self.styleId = 0
+        # The current style is the whole SGR state, so (style, bits) -> style
+        # transitions can be memoized
+        self.transitions = {}
+
+    def feed(self, chunk):
+        self.apply(self.tokens.feed(chunk))
+
+    def close(self):
+        """Apply whatever the stream still held back and return the screen."""
+        self.apply(self.tokens.close())
+        return self.screen
+
+    def text(self) -> str:
+        """The screen as plain text, as txt() renders it."""
+        return txt(self.screen)
+
+    def apply(self, blocks):
+        """Update the screen with parsed tokens."""
+        screen = self.screen
+        styleId = self.styleId
+        transitions = self.transitions
+
+        for block in blocks:
+            match block:
+                case Text(text):
+                    screen.addText(text, styleId)
+                case ('CSI', 'SGR', bits):
+                    key = (styleId, tuple(bits))
+                    nextId = transitions.get(key)
+                    if nextId is None:
+                        nextId = transitions[key] = screen.style(*applySGR(screen.styles[styleId], bits))
+                    styleId = nextId
+                case ('icon', _): pass
+                case ('icon+title', _): pass
+                case ('title', _): pass
+                case ('CSI', 'RM', *_): pass
+                case ('CSI', 'SM', *_): pass
+                case ('CSI', 'keyboard transmit mode [linux]', *_): pass
+                case ('CSI', 'erase line', 'to end'): screen.eraseLineToEnd()
+                case ('CSI', 'erase line', 'x'): pass
+                case ('CSI', 'erase screen', 'to end'): screen.eraseScreenToEnd()
+                case ('CSI', 'erase screen', 'to all'): screen.eraseScreen()
+                case ('CSI', 'erase screen', 'to all and scrollback'): screen.eraseScreen()
+                case ('CSI', 'set F5 string', *_): pass
+                case ('cursor position', row, col): screen.setCursor(row, col)
+                case ('cursor up', n): screen.setCursor(screen.row - n, screen.col)
+                case ('cursor down', n): screen.setCursor(screen.row + n, screen.col)
+                case ('cursor forward', n): screen.setCursor(screen.row, screen.col + n)
+                case ('cursor backward', n): screen.setCursor(screen.row, screen.col - n)
+                case ('cwd', *_): pass
+                case 'G(0)': pass
+                case 'KeypadMode(numeric)': pass
+                case 'KeypadMode(application)': pass
+                case ('new-command and prompt-mode', _): pass
+                case ('end-prompt, start-input', _): pass
+                case ('end-input, start-output', _): pass
+                case ('end-current-command', _): pass
+                case _: raise NotImplementedError(block)
+
+        self.styleId = styleId
+
+def render(blocks):
+    emulator = Emulator()
+    emulator.apply(blocks)
+    return emulator.screen
 
 # Aesthetic color themes for SVG rendering
 COLOR_THEMES = {
@@ -556,13 +669,37 @@ def get_themed_color(color, theme='dracula'):
     
     return color
 
-def txt(buffer):
-    return '\n'.join(''.join(c.char for c in line) for line in buffer).rstrip() + '\n'
-
-def svg(buffer, theme='dracula'):
-    # Calculate dimensions based on buffer content
-    max_width = max(len(line) for line in buffer) if buffer else 0
-    max_height = len(buffer)
+def txt(screen):
+    return '\n'.join(screen.line(row) for row in range(len(screen))).rstrip() + '\n'
+
+def styleKey(style) -> str:
+    """Canonical text of a (foreground, background, attributes) style."""
+    foreground, background, attributes = style
+    return f'{foreground!r} {background!r} {sorted(attributes)!r}'
+
+def cellDigest(screen) -> str:
+    """SHA-256 over the screen's cell grid: every row's characters and styles.
+
+    Independent of style interning order and of any output format, so it only
+    changes when what the terminal shows changes.
+    """
+    import hashlib
+    import itertools
+    keys = [styleKey(style).encode() for style in screen.styles]
+    digest = hashlib.sha256()
+    for chars, styleIds in zip(screen.chars, screen.styleIds):
+        text = chars.tobytes().decode(_UTF32).encode('utf-8')
+        digest.update(b'%d:%s' % (len(text), text))
+        for styleId, run in itertools.groupby(styleIds):
+            key = keys[styleId]
+            digest.update(b'%d*%d:%s' % (len(list(run)), len(key), key))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def svg(screen, theme='dracula'):
+    # Calculate dimensions based on screen content
+    max_width = max(len(line) for line in screen.chars) if len(screen) else 0
+    max_height = len(screen)
     
     char_width = 10
     char_height = 20
@@ -576,52 +713,170 @@ def svg(buffer, theme='dracula'):
     
     output = [
         f'<svg xmlns="http://www.w3.org/2000/svg" font-family="JetBrains Mono, Fira Code, SF Mono, Monaco, Consolas, monospace" font-size="16"',
-        f'viewBox="0 0 {svg_width} {svg_height}" width="{svg_width}" height="{svg_height}">'
+        f'viewBox="0 0 {svg_width} {svg_height}" width="{svg_width}" height="{svg_height}" xml:space="preserve">'
     ]
     
     # Add themed background fill for the entire SVG
     output.append(f'<rect x="0" y="0" width="{svg_width}" height="{svg_height}" fill="{bg_color}"/>')
 
-    # First pass: draw background rectangles
-    for y, line in enumerate(buffer):
-        for x, char in enumerate(line):
-            if char.background:
-                themed_bg = get_themed_color(char.background, theme)
-                rect_x = (x + 1) * char_width
-                rect_y = y * char_height + char_height // 4  # Align with text baseline
-                output.append(f'<rect x="{rect_x}" y="{rect_y}" width="{char_width}" height="{char_height}" fill="{themed_bg}"/>')
-
-    # Second pass: draw text characters
-    for y, line in enumerate(buffer):
-        for x, char in enumerate(line):
-            attributes = []
-            if 'bold' in char.attributes:
-                attributes.append('font-weight="bold"')
-            if 'italic' in char.attributes:
-                attributes.append('font-style="italic"')
-            if 'underline' in char.attributes:
-                attributes.append('text-decoration="underline"')
-            if char.foreground:
-                themed_fg = get_themed_color(char.foreground, theme)
-                attributes.append(f'fill="{themed_fg}"')
-            else:
-                attributes.append(f'fill="{default_fg_color}"')  # Use themed default text color
-                
+    # Theme each interned style once: (text attributes, themed background,
+    # whether trailing blanks are visible)
+    themed = []
+    for foreground, background, attributes in screen.styles:
+        svg_attributes = []
+        if 'bold' in attributes:
+            svg_attributes.append('font-weight="bold"')
+        if 'italic' in attributes:
+            svg_attributes.append('font-style="italic"')
+        if 'underline' in attributes:
+            svg_attributes.append('text-decoration="underline"')
+        svg_attributes.append(f'fill="{get_themed_color(foreground, theme) if foreground else default_fg_color}"')
+        themed.append((' '.join(svg_attributes),
+                       get_themed_color(background, theme) if background else None,
+                       'underline' in attributes))
+
+    # Split every row into runs of adjacent cells sharing a style. An EMPTY
+    # cell holds its grid slot without a glyph, so it always ends a run.
+    rows = []
+    for y in range(len(screen)):
+        runs = []
+        chars, styleIds = screen.chars[y], screen.styleIds[y]
+        x, width = 0, len(chars)
+        while x < width:
+            styleId = styleIds[x]
+            end = x
+            while end < width and styleIds[end] == styleId and chars[end] != EMPTY:
+                end += 1
+            if end == x:
+                x += 1
+                continue
+            runs.append((x, end, styleId))
+            x = end
+        rows.append(runs)
+
+    # First pass: draw background rectangles, merged horizontally across runs
+    # that resolve to the same themed color
+    for y, runs in enumerate(rows):
+        rect_y = y * char_height + char_height // 4  # Align with text baseline
+        start = end = 0
+        fill = None
+        for x, run_end, styleId in runs:
+            background = themed[styleId][1]
+            if background == fill and x == end:
+                end = run_end
+                continue
+            if fill:
+                output.append(f'<rect x="{(start + 1) * char_width}" y="{rect_y}" width="{(end - start) * char_width}" height="{char_height}" fill="{fill}"/>')
+            start, end, fill = x, run_end, background
+        if fill:
+            output.append(f'<rect x="{(start + 1) * char_width}" y="{rect_y}" width="{(end - start) * char_width}" height="{char_height}" fill="{fill}"/>')
+
+    # Second pass: draw one text element per run. textLength pins the run to
+    # the cell grid so multi-character runs line up with the rectangles.
+    for y, runs in enumerate(rows):
+        chars = screen.chars[y]
+        text_y = (y + 1) * char_height
+        for x, end, styleId in runs:
+            svg_attributes, _, underline = themed[styleId]
+            text = ''.join(map(chr, chars[x:end]))
+            if not underline:
+                # Blanks are invisible unless underlined
+                stripped = text.lstrip(' ')
+                x += len(text) - len(stripped)
+                text = stripped.rstrip(' ')
+                if not text:
+                    continue
             text_x = (x + 1) * char_width
-            text_y = (y + 1) * char_height
-            
+            length = f' textLength="{len(text) * char_width}"' if len(text) > 1 else ''
+
             # Escape special XML characters
-            escaped_char = char.char.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            
-            output.append(f'<text x="{text_x}" y="{text_y}" {' '.join(attributes)}>{escaped_char}</text>')
+            escaped = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+            output.append(f'<text x="{text_x}" y="{text_y}"{length} {svg_attributes}>{escaped}</text>')
 
     output.append('</svg>')
     return '\n'.join(output)
 
+def emulate(stream, chunkSize=1 << 16):
+    """Render a binary stream chunk by chunk, without holding all of it."""
+    emulator = Emulator()
+    for chunk in iter(lambda: stream.read1(chunkSize), b''):
+        emulator.feed(chunk)
+    return emulator.close()
+
+FORMATS = ('txt', 'decoded', 'svg')
+
+def convert(path: str, formats=FORMATS, themes=('dracula',)):
+    """Write the requested formats next to the .ansi file at path from a single
+    parse and render; returns the paths written.
+
+    Each file is byte-for-byte what the matching main() mode prints. The
+    default theme's SVG is <name>.svg, any other theme's <name>.<theme>.svg.
+    """
+    stem = path[:-len('.ansi')] if path.endswith('.ansi') else path
+    with open(path, 'rb') as f:
+        tokens = parse(f.read())
+    outputs = {}
+    if 'decoded' in formats:
+        outputs[f'{stem}.decoded'] = ''.join(f'{token}\n' for token in tokens)
+    if 'txt' in formats or 'svg' in formats:
+        screen = render(tokens)
+        if 'txt' in formats:
+            outputs[f'{stem}.txt'] = txt(screen) + '\n'
+        if 'svg' in formats:
+            for theme in themes:
+                name = f'{stem}.svg' if theme == 'dracula' else f'{stem}.{theme}.svg'
+                outputs[name] = svg(screen, theme) + '\n'
+    for name, text in outputs.items():
+        with open(name, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return list(outputs)
+
+def batch(argv):
+    """`ansi2txt.py batch`: convert many recordings across a process pool."""
+    import argparse
+    import concurrent.futures
+    import os
+
+    parser = argparse.ArgumentParser(prog='ansi2txt.py batch',
+                                     description='Convert .ansi recordings to .txt, .decoded and .svg, parsing each once')
+    parser.add_argument('paths', nargs='+', help='.ansi files, or directories to convert every .ansi file in')
+    parser.add_argument('--format', dest='formats', action='append', choices=FORMATS,
+                        help='Output format; repeat for several (default: all)')
+    parser.add_argument('--theme', dest='themes', action='append', choices=list(COLOR_THEMES),
+                        help='SVG color theme; repeat for several (default: dracula)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='Worker processes')
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.ansi')))
+        else:
+            files.append(path)
+    work = functools.partial(convert, formats=tuple(args.formats or FORMATS), themes=tuple(args.themes or ['dracula']))
+
+    failed = 0
+    jobs = max(1, min(args.jobs or 1, len(files)))
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        for path, future in [(path, pool.submit(work, path)) for path in files]:
+            try:
+                written = future.result()
+            except Exception as e:
+                failed += 1
+                print(f'Failed {path}: {e!r}', file=sys.stderr)
+            else:
+                print(f'Converted {os.path.basename(path)} to {", ".join(os.path.basename(name) for name in written)}')
+    return 1 if failed else 0
+
 def main():
+    if sys.argv[1:2] == ['batch']:
+        sys.exit(batch(sys.argv[2:]))
+
     # Check for help or list themes
     if '--help' in sys.argv or '-h' in sys.argv:
         print("Usage: ansi2txt.py [--svg [--theme=<theme>]] [--decode-only] [--list-themes]")
+        print("       ansi2txt.py batch [--format=<format>]... [--theme=<theme>]... [--jobs=<n>] <path>...")
         print("Convert ANSI escape sequences to plain text or SVG")
         print("")
         print("Options:")
@@ -630,6 +885,9 @@ def main():
         print("  --decode-only      Only decode escape sequences")
         print("  --list-themes      List available color themes")
         print("  --help, -h         Show this help message")
+        print("")
+        print("batch converts .ansi files (or directories of them) to .txt, .decoded and .svg")
+        print("next to each input, parsing each once; see `ansi2txt.py batch --help`.")
         return
     
     if '--list-themes' in sys.argv:
@@ -638,11 +896,8 @@ def main():
             print(f"  {theme_name}")
         return
 
-    inputBytes = sys.stdin.buffer.read()
-    parsed = parse(inputBytes)
-
     if '--decode-only' in sys.argv:
-        for item in parsed:
+        for item in parse(sys.stdin.buffer.read()):
             print(item)
     elif '--svg' in sys.argv:
         # Check for theme argument
@@ -659,9 +914,9 @@ def main():
             print("Use --list-themes to see all available themes.", file=sys.stderr)
             sys.exit(1)
             
-        print(svg(render(parsed), theme))
+        print(svg(emulate(sys.stdin.buffer), theme))
     else:
-        print(txt(render(parsed)))
+        print(txt(emulate(sys.stdin.buffer)))
 
 
 if __name__ == '__main__':
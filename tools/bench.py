@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the launcher and the activation scripts.
+
+Each subcommand prints one line per measured variant so that numbers from
+two trees (e.g. before/after a change) can be compared side by side:
+
+    git show HEAD~1:src/subshell.py > /tmp/before.py   # or a bundled dist/bin/subshell
+    python tools/bench.py startup --shell zsh dist/bin/subshell /tmp/before.py
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import pty
+import py_compile
+import re
+import select
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LAUNCHER = ROOT / 'src' / 'subshell.py'
+
+# Both zsh (ZLE) and fish enable bracketed paste when the line editor is ready
+# for input, which is the closest observable point to "the prompt is up".
+PROMPT_READY = b'\x1b[?2004h'
+
+
+def wait_for_prompt(fd, timeout=10.0, what='shell'):
+    """Read from the pty master until the line editor reports it is ready."""
+    deadline = time.perf_counter() + timeout
+    seen = b''
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TimeoutError(f'no prompt from {what} within {timeout}s')
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if not ready:
+            continue
+        try:
+            chunk = os.read(fd, 65536)
+        except OSError:
+            chunk = b''
+        if not chunk:
+            raise RuntimeError(f'{what} exited before showing a prompt: {seen[-200:]!r}')
+        # Only keep enough of a tail to match the marker across chunks
+        seen = seen[-len(PROMPT_READY):] + chunk
+        if PROMPT_READY in seen:
+            return
+
+
+def spawn_in_pty(argv, env):
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.execvpe(argv[0], argv, env)
+    return pid, fd
+
+
+def kill_pty(pid, fd):
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    os.close(fd)
+
+
+def time_to_prompt(argv, env, timeout=10.0):
+    """Run argv in a pty and return seconds until the line editor is ready."""
+    start = time.perf_counter()
+    pid, fd = spawn_in_pty(argv, env)
+    try:
+        wait_for_prompt(fd, timeout, what=argv)
+        return time.perf_counter() - start
+    finally:
+        kill_pty(pid, fd)
+
+
+def report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f'{label:<40} median {statistics.median(ms):8.1f} ms   min {min(ms):8.1f} ms   n={len(ms)}')
+
+
+def bench_startup(args):
+    env = dict(os.environ, SHELL=args.shell, TERM='xterm-256color')
+    launchers = args.launchers or [str(LAUNCHER)]
+    for launcher in launchers:
+        argv = [sys.executable, launcher]
+        time_to_prompt(argv, env)  # warm the page cache
+        samples = [time_to_prompt(argv, env) for _ in range(args.runs)]
+        report(f'{args.shell}: {launcher}', samples)
+
+
+def process_tree(pid):
+    """Return [(pid, comm, rss_kb)] for pid and all of its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm may contain spaces; the fields after it are space separated
+        ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree = []
+    todo = [pid]
+    while todo:
+        p = todo.pop()
+        try:
+            with open(f'/proc/{p}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        rss = int(status.get('VmRSS', '0 kB').split()[0])
+        tree.append((p, status['Name'].strip(), rss))
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def bench_nesting(args):
+    """Resident memory of a session nested args.depth subshells deep."""
+    env = dict(os.environ, SHELL=args.shell, TERM='xterm-256color')
+    launchers = args.launchers or [str(LAUNCHER)]
+    for launcher in launchers:
+        argv = [sys.executable, launcher, *args.launcher_args]
+        pid, fd = spawn_in_pty(argv, env)
+        try:
+            wait_for_prompt(fd, what=argv)
+            for _ in range(args.depth - 1):
+                os.write(fd, ' '.join(f"'{a}'" for a in argv).encode() + b'\n')
+                wait_for_prompt(fd, what=argv)
+            tree = process_tree(pid)
+        finally:
+            kill_pty(pid, fd)
+        pythons = [p for p in tree if p[1].startswith('python')]
+        total = sum(rss for _, _, rss in tree)
+        print(f'{launcher:<40} depth {args.depth}: {len(tree)} processes, '
+              f'{len(pythons)} python, total RSS {total / 1024:7.1f} MB, '
+              f'python RSS {sum(p[2] for p in pythons) / 1024:7.1f} MB')
+
+
+def load_launcher(path):
+    """Import a launcher script (any revision) as a module."""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(f'launcher_{abs(hash(path))}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_dotenv(path, lines):
+    """Write a synthetic env bundle: plain, quoted and multi-line certificate values."""
+    written = 0
+    with open(path, 'w') as f:
+        i = 0
+        while written < lines:
+            i += 1
+            if i % 1000 == 0:
+                body = '\n'.join('MIIB' + 'A' * 60 for _ in range(20))
+                f.write(f'CERT_{i}="-----BEGIN CERTIFICATE-----\n{body}\n-----END CERTIFICATE-----"\n')
+                written += 23
+            elif i % 10 == 0:
+                f.write(f'# section {i}\n')
+                written += 1
+            elif i % 3 == 0:
+                f.write(f'export QUOTED_{i}="value with spaces {i}"\n')
+                written += 1
+            else:
+                f.write(f'PLAIN_{i}=value-{i}\n')
+                written += 1
+
+
+def bench_dotenv(args):
+    """Parse time and peak memory of _parse_dotenv_file on a generated bundle."""
+    launchers = args.launchers or [str(LAUNCHER)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'bundle.env'
+        generate_dotenv(path, args.lines)
+        print(f'{args.lines} lines, {path.stat().st_size / 1e6:.1f} MB')
+        for launcher in launchers:
+            parse = load_launcher(launcher)._parse_dotenv_file
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                result = parse(path)
+                samples.append(time.perf_counter() - start)
+            env = result[0] if isinstance(result, tuple) else result
+            tracemalloc.start()
+            parse(path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report(launcher, samples)
+            print(f'{"":<40} {len(env)} keys, peak traced memory {peak / 1e6:.1f} MB')
+
+
+def bench_zsh_activation(args):
+    """Shell start to exit for each way of loading activate.zsh."""
+    launcher = load_launcher(str(LAUNCHER))
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / 'plain' / 'activate.zsh'
+        plain.parent.mkdir()
+        plain.write_text(launcher.load_script('activate.zsh'))
+        compiled = launcher.compiled_zsh_activation(str(Path(tmp) / 'cache'), args.zsh)
+        if compiled is None:
+            raise RuntimeError(f'could not compile activate.zsh with {args.zsh}')
+        modes = {
+            'eval (subshell activate)': f'eval "$({sys.executable} {LAUNCHER} activate zsh)"',
+            'eval (file contents)': f'eval "$(<{plain})"',
+            'source': f'source {plain}',
+            'source (.zwc)': f'source {compiled}',
+        }
+        for label, snippet in modes.items():
+            argv = [args.zsh, '-f', '-c', snippet]
+            subprocess.run(argv, check=True)
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                subprocess.run(argv, check=True)
+                samples.append(time.perf_counter() - start)
+            report(label, samples)
+
+
+SCRIPTS = ROOT / 'src' / 'scripts'
+
+
+def count_forks(argv, env=None):
+    """Number of process-creating syscalls made by argv and its children (strace)."""
+    with tempfile.NamedTemporaryFile('r', suffix='.strace') as trace:
+        subprocess.run(['strace', '-f', '-qq', '-e', 'trace=fork,vfork,clone,clone3', '-o', trace.name, *argv],
+                       env=env, check=True, stdout=subprocess.DEVNULL)
+        # Threads are clone() calls too; only count new processes
+        return sum(1 for line in trace if 'resumed>' not in line and 'CLONE_THREAD' not in line
+                   and ('clone' in line or 'fork(' in line))
+
+
+def zsh_forks(zsh, prompts):
+    """Forks made by N runs of the generic zsh precmd hook, over a zero-prompt baseline."""
+    def argv(prompts):
+        return [zsh, '-f', '-c', f'''
+            PROMPT='%n@%m %~ %# '
+            source {SCRIPTS / 'activate.zsh'}
+            subshell_late_detect; subshell_precmd
+            repeat {prompts} {{ subshell_late_detect; subshell_precmd }}
+        ''']
+    return count_forks(argv(prompts)) - count_forks(argv(0))
+
+
+def bench_zsh_forks(args):
+    """Forks per prompt in the generic zsh path: N precmd hook runs vs. zero, under strace."""
+    forks = zsh_forks(args.zsh, args.prompts)
+    per_prompt = forks / args.prompts
+    print(f'zsh generic precmd: {per_prompt:.2f} forks per prompt ({forks} over {args.prompts} prompts)')
+    if per_prompt > 0:
+        print('FAIL: prompt rendering forks', file=sys.stderr)
+        return 1
+    return 0
+
+
+def bench_fish_render(args):
+    """Per-render cost of the wrapped generic fish_prompt: wall time and forks."""
+    scripts = args.scripts or [str(SCRIPTS / 'activate.fish')]
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('STARSHIP_', 'SUBSHELL_', '__SUBSHELL'))}
+    env.update(SUBSHELL_ROOT=str(ROOT), SUBSHELL_PROMPT='bench')
+
+    def argv(script, renders):
+        return [args.fish, '--no-config', '-c', f'''
+            source {script}
+            fish_prompt >/dev/null
+            set -l i 0
+            while test $i -lt {renders}
+                fish_prompt >/dev/null
+                set i (math $i + 1)
+            end
+        ''']
+
+    def elapsed(script, renders):
+        start = time.perf_counter()
+        subprocess.run(argv(script, renders), env=env, check=True)
+        return time.perf_counter() - start
+
+    for script in scripts:
+        samples = [(elapsed(script, args.renders) - elapsed(script, 0)) / args.renders for _ in range(args.runs)]
+        report(script, samples)
+        if args.forks:
+            forks = count_forks(argv(script, args.renders), env) - count_forks(argv(script, 0), env)
+            print(f'{"":<40} {forks / args.renders:.2f} forks per render')
+    return 0
+
+
+def bench_nu_render(args):
+    """Per-render cost of the wrapped nushell PROMPT_COMMAND closure."""
+    scripts = args.scripts or [str(SCRIPTS / 'activate.nu')]
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('SUBSHELL_', '__SUBSHELL'))}
+    env.update(SUBSHELL_ROOT=str(ROOT), SUBSHELL_PROMPT='bench')
+
+    def elapsed(script, renders):
+        argv = [args.nu, '--no-config-file', '-c',
+                f"source '{script}'; for _ in 0..<{renders} {{ do $env.PROMPT_COMMAND | ignore }}"]
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, cwd=ROOT, check=True)
+        return time.perf_counter() - start
+
+    for script in scripts:
+        samples = [(elapsed(script, args.renders) - elapsed(script, 0)) / args.renders for _ in range(args.runs)]
+        report(script, samples)
+    return 0
+
+
+def bench_starship_forks(args):
+    """Child processes per `starship prompt` whose format holds only the subshell modules."""
+    bundled = SCRIPTS / 'starship.toml'
+    configs = [Path(c) for c in args.configs] or [bundled]
+    env = dict(os.environ, SUBSHELL_PROMPT='bench', SUBSHELL_OUTSIDE='0', SUBSHELL_ROOT=str(ROOT),
+               SUBSHELL_STARSHIP_INSIDE='bench')
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for config in configs:
+            text = config.read_text()
+            modules = re.findall(r'^\[((?:custom|env_var)\.subshell_\w+)\]', text, re.M)
+            merged = Path(tmp) / 'starship.toml'
+            merged.write_text(f'format = "{"".join("$" + m for m in modules)}"\n\n{text}')
+            env['STARSHIP_CONFIG'] = str(merged)
+            forks = count_forks([args.starship, 'prompt'], env)
+            print(f'{str(config):<40} {forks} child processes per prompt')
+            failed |= forks > 0 and config.resolve() == bundled.resolve()
+    if failed:
+        print('FAIL: bundled starship modules spawn processes', file=sys.stderr)
+        return 1
+    return 0
+
+
+ANSI2TXT = ROOT / 'tools' / 'ansi2txt.py'
+RECORDINGS = ROOT / 'verified-prompts'
+
+
+def synthetic_recording(megabytes):
+    """A session recording of at least megabytes: the verified prompt captures,
+    each followed by a screenful of `ls -l`-style command output."""
+    output = b''.join(
+        b'-rw-r--r--  1 user  staff  %6d Oct 18 04:12 \x1b[34mfile%04d.txt\x1b[0m\r\n' % (i * 37, i)
+        for i in range(40))
+    sample = b''.join(path.read_bytes() + output for path in sorted(RECORDINGS.glob('*.ansi')))
+    return sample * -(-int(megabytes * 1e6) // len(sample))
+
+
+def bench_ansi2txt(args):
+    """Tokenizer throughput of ansi2txt.parse, then render time and memory, on a multi-megabyte recording."""
+    data = synthetic_recording(args.megabytes)
+    for path in args.scripts or [str(ANSI2TXT)]:
+        module = load_launcher(path)
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            tokens = module.parse(data)
+            samples.append(time.perf_counter() - start)
+        report(f'{path} parse', samples)
+        print(f'{"":<40} {len(data) / 1e6:.1f} MB, {len(tokens)} tokens, '
+              f'{len(data) / 1e6 / statistics.median(samples):.1f} MB/s')
+
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            module.render(tokens)
+            samples.append(time.perf_counter() - start)
+        report(f'{path} render', samples)
+        tracemalloc.start()
+        screen = module.render(tokens)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del screen
+        print(f'{"":<40} screen {size / 1e6:.1f} MB, peak traced memory {peak / 1e6:.1f} MB')
+    return 0
+
+
+def bench_ansi2txt_svg(args):
+    """SVG writer time and output size over the verified-prompts corpus."""
+    recordings = [path.read_bytes() for path in sorted(RECORDINGS.glob('*.ansi'))]
+    for path in args.scripts or [str(ANSI2TXT)]:
+        module = load_launcher(path)
+        screens = [module.render(module.parse(data)) for data in recordings]
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            documents = [module.svg(screen, args.theme) for screen in screens]
+            samples.append(time.perf_counter() - start)
+        report(f'{path} svg', samples)
+        size = sum(len(document.encode()) for document in documents)
+        elements = sum(document.count('\n<') for document in documents)
+        print(f'{"":<40} {len(documents)} recordings, {size / 1e3:.1f} kB, {elements} elements')
+    return 0
+
+
+# Modules the launcher must not pull in at import time; they are imported
+# lazily by the code paths that need them.
+LAZY_MODULES = {'argparse', 'subprocess', 'tempfile', 'textwrap', 'pty', 'pathlib'}
+
+# Median self time of the modules `import subshell` adds, in milliseconds,
+# for a warm import from cached bytecode (the source compile, paid once per
+# launcher version, is not included; see compile_launcher). Importing the
+# launcher measures well under 1 ms; pulling argparse or subprocess back in
+# at module load costs several times this budget.
+IMPORT_BUDGET_MS = 3.0
+
+
+def compile_launcher():
+    """Write the launcher's bytecode so imports are measured warm, even when
+    PYTHONDONTWRITEBYTECODE keeps the interpreter from caching it."""
+    py_compile.compile(str(LAUNCHER), doraise=True)
+
+
+def imported_modules(code):
+    """Return {module: self_us} as reported by `python -X importtime -c code`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=LAUNCHER.parent, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def bench_importtime(args):
+    """Fail when importing the launcher costs more than the stated budget."""
+    compile_launcher()
+    baseline = imported_modules('pass')
+    samples = []
+    for _ in range(args.runs):
+        modules = imported_modules(f'import {LAUNCHER.stem}')
+        added = {name: us for name, us in modules.items() if name not in baseline}
+        samples.append(sum(added.values()) / 1e6)
+    report(f'import {LAUNCHER.stem}', samples)
+
+    eager = sorted(LAZY_MODULES & added.keys())
+    if eager:
+        print(f'FAIL: imported at module load: {", ".join(eager)}', file=sys.stderr)
+        return 1
+    cost_ms = statistics.median(samples) * 1000
+    if cost_ms > args.budget_ms:
+        print(f'FAIL: import cost {cost_ms:.2f} ms exceeds budget of {args.budget_ms} ms', file=sys.stderr)
+        return 1
+    print(f'OK: within {args.budget_ms} ms budget')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench.py')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p_startup = subparsers.add_parser('startup', help='Time from launch to first interactive prompt')
+    p_startup.add_argument('launchers', nargs='*', help='Launcher scripts to compare (default: src/subshell.py)')
+    p_startup.add_argument('--shell', default='zsh', help='Shell to launch via $SHELL (default: zsh)')
+    p_startup.add_argument('--runs', type=int, default=20)
+    p_startup.set_defaults(func=bench_startup)
+
+    p_import = subparsers.add_parser('importtime', help='Check launcher import cost against a budget (-X importtime)')
+    p_import.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS,
+                          help=f'Maximum median warm import cost, from cached bytecode (default: {IMPORT_BUDGET_MS:g} ms)')
+    p_import.add_argument('--runs', type=int, default=5)
+    p_import.set_defaults(func=bench_importtime)
+
+    p_nesting = subparsers.add_parser('nesting', help='Resident memory of nested subshell sessions')
+    p_nesting.add_argument('launchers', nargs='*', help='Launcher scripts to compare (default: src/subshell.py)')
+    p_nesting.add_argument('--shell', default='zsh', help='Shell to launch via $SHELL (default: zsh)')
+    p_nesting.add_argument('--depth', type=int, default=5)
+    p_nesting.add_argument('--launcher-args', nargs='*', default=[], help='Extra arguments for each launcher, e.g. --wait')
+    p_nesting.set_defaults(func=bench_nesting)
+
+    p_dotenv = subparsers.add_parser('dotenv', help='Parse time and peak memory on a large generated dotenv file')
+    p_dotenv.add_argument('launchers', nargs='*', help='Launcher scripts to compare (default: src/subshell.py)')
+    p_dotenv.add_argument('--lines', type=int, default=100_000)
+    p_dotenv.add_argument('--runs', type=int, default=5)
+    p_dotenv.set_defaults(func=bench_dotenv)
+
+    p_zsh = subparsers.add_parser('zsh-activation', help='Compare eval, source and compiled (.zwc) activate.zsh')
+    p_zsh.add_argument('--zsh', default='zsh')
+    p_zsh.add_argument('--runs', type=int, default=20)
+    p_zsh.set_defaults(func=bench_zsh_activation)
+
+    p_forks = subparsers.add_parser('zsh-forks', help='Fail if rendering a zsh prompt forks (needs strace)')
+    p_forks.add_argument('--zsh', default='zsh')
+    p_forks.add_argument('--prompts', type=int, default=100)
+    p_forks.set_defaults(func=bench_zsh_forks)
+
+    p_fish = subparsers.add_parser('fish-render', help='Per-render time of the generic fish prompt wrapper')
+    p_fish.add_argument('scripts', nargs='*', help='activate.fish files to compare (default: src/scripts/activate.fish)')
+    p_fish.add_argument('--fish', default='fish')
+    p_fish.add_argument('--renders', type=int, default=500)
+    p_fish.add_argument('--runs', type=int, default=5)
+    p_fish.add_argument('--forks', action='store_true', help='Also count forks per render (needs strace)')
+    p_fish.set_defaults(func=bench_fish_render)
+
+    p_nu = subparsers.add_parser('nu-render', help='Per-render time of the nushell PROMPT_COMMAND wrapper')
+    p_nu.add_argument('scripts', nargs='*', help='activate.nu files to compare (default: src/scripts/activate.nu)')
+    p_nu.add_argument('--nu', default='nu')
+    p_nu.add_argument('--renders', type=int, default=500)
+    p_nu.add_argument('--runs', type=int, default=5)
+    p_nu.set_defaults(func=bench_nu_render)
+
+    p_starship = subparsers.add_parser('starship-forks', help='Fail if the bundled starship modules spawn processes (needs strace)')
+    p_starship.add_argument('configs', nargs='*', help='starship.toml files to compare (default: src/scripts/starship.toml)')
+    p_starship.add_argument('--starship', default='starship')
+    p_starship.set_defaults(func=bench_starship_forks)
+
+    p_ansi = subparsers.add_parser('ansi2txt', help='Parse and render cost of tools/ansi2txt.py on a large recording')
+    p_ansi.add_argument('scripts', nargs='*', help='ansi2txt.py files to compare (default: tools/ansi2txt.py)')
+    p_ansi.add_argument('--megabytes', type=float, default=8)
+    p_ansi.add_argument('--runs', type=int, default=3)
+    p_ansi.set_defaults(func=bench_ansi2txt)
+
+    p_svg = subparsers.add_parser('ansi2txt-svg', help='SVG writer time and output size on the verified-prompts corpus')
+    p_svg.add_argument('scripts', nargs='*', help='ansi2txt.py files to compare (default: tools/ansi2txt.py)')
+    p_svg.add_argument('--theme', default='dracula')
+    p_svg.add_argument('--runs', type=int, default=20)
+    p_svg.set_defaults(func=bench_ansi2txt_svg)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
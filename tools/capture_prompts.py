@@ -55,6 +55,17 @@ THEME_USER = {
     'powerlevel10k': 'demo-oh-my-zsh-p10k',
 }
 
+# Seconds of quiet after each prompt-ready marker before the next command.
+# Oh My Zsh (async git status) and Powerlevel10k (gitstatusd, instant prompt)
+# redraw the prompt after the line editor is ready, so they keep the 0.7 s
+# window the captures were verified with; the others draw it in one go.
+THEME_SETTLE = {
+    'default': 0.05,
+    'starship': 0.05,
+    'ohmyzsh': 0.7,
+    'powerlevel10k': 0.7,
+}
+
 def name_for(shell: str, theme: str, blank: bool, prompt_test: str = None) -> str:
     base = f'test-{shell}-{theme}'
     if blank:
@@ -69,7 +80,7 @@ def ensure_bundle():
 def ensure_image():
         subprocess.run(['make', 'image'], check=True)
 
-def capture_one(shell: str, theme: str, blank: bool, force: bool, prompt_test: str = None) -> bool:
+def capture_one(shell: str, theme: str, blank: bool, force: bool, prompt_test: str = None, typing: bool = False) -> bool:
     name = name_for(shell, theme, blank, prompt_test)
     user = THEME_USER[theme]
     if blank:
@@ -88,7 +99,7 @@ def capture_one(shell: str, theme: str, blank: bool, force: bool, prompt_test: s
         env_vars['SUBSHELL_PROMPT'] = 'mycustom'
     
     import asyncio
-    output = asyncio.run(capture_session(user, shell, test_script, env_vars))
+    output = asyncio.run(capture_session(user, shell, test_script, env_vars, typing, THEME_SETTLE[theme]))
     (ASSETS / (name + '.ansi')).write_bytes(output)
     return True
 
@@ -108,6 +119,7 @@ def iter_needed(force: bool):
 
 def main():
     force = '--force' in sys.argv
+    typing = '--typing' in sys.argv  # type commands out instead of sending each in one burst
     ensure_image()
     ASSETS.mkdir(exist_ok=True)
     needed = list(iter_needed(force))
@@ -118,7 +130,7 @@ def main():
     for shell, theme, blank, prompt_test in needed:
         base = name_for(shell, theme, blank, prompt_test)
         print(f'[capture] {base}')
-        if not capture_one(shell, theme, blank, force, prompt_test):
+        if not capture_one(shell, theme, blank, force, prompt_test, typing):
             ok = False
     if not ok:
         sys.exit(1)
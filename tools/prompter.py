@@ -1,6 +1,13 @@
 from termrec import terminal
 
-async def capture_session(user, shell, script, env_vars=None):
+async def capture_session(user, shell, script, env_vars=None, typing=False, settle=0.05):
+    """Record a demo container session running script, one command per prompt.
+
+    Each command is sent once the shell is ready for input and its output has
+    been quiet for settle seconds (see Terminal.waitForPrompt); themes that
+    redraw the prompt asynchronously need a longer settle. typing=True types
+    each command out character by character.
+    """
     output = []
 
     if shell == 'fish':
@@ -33,23 +40,17 @@ async def capture_session(user, shell, script, env_vars=None):
     
     cmd.append('subshell-demo-tools')
 
-    smBracketedPaste = b'\x1b[?2004h'  # Bracketed paste mode enable
-
     def record(c):
         output.append(c)
 
     async with terminal(cmd, onOutput=record) as term:
-        if not await term.waitForOutput(smBracketedPaste):  # Enable bracketed paste mode - indicates shell waiting for input
-            raise ValueError("Timeout waiting for initial prompt (bracketed paste enable sequence)", b''.join(output))
-        if not await term.waitForStability(0.7):
-            raise ValueError("Timeout waiting for stable output", b''.join(output))
+        if not await term.waitForPrompt(settle=settle):
+            raise ValueError("Timeout waiting for initial prompt", b''.join(output))
 
         for command in script:
-            await term.send(command)
-            if not await term.waitForOutput(smBracketedPaste):
-                raise ValueError("Timeout waiting for initial prompt (bracketed paste enable sequence)", b''.join(output))
-            if not await term.waitForStability(0.7):
-                raise ValueError("Timeout waiting for stable output", b''.join(output))
+            await term.send(command, typing=typing)
+            if not await term.waitForPrompt(settle=settle):
+                raise ValueError(f"Timeout waiting for prompt after {command!r}", b''.join(output))
 
     return b''.join(output)
 
@@ -1,9 +1,7 @@
 import asyncio
 from contextlib import asynccontextmanager
 import re
-import os, pty, tty, termios, fcntl, select, errno, struct, signal, time
-
-import ansi2txt
+import os, pty, tty, termios, fcntl, select, errno, struct, signal, sys, time
 
 
 
@@ -14,6 +12,11 @@ script = [
     "exit",
 ]
 
+# The line editor has started reading input: the end-of-prompt shell
+# integration marker (OSC 133;B) or, for shells that emit none, bracketed
+# paste being enabled, which zsh, fish and bash do each time they read a line
+PROMPT_READY = re.compile(rb'\x1b\]133;B|\x1b\[\?2004h')
+
 def open_raw_pty(rows=100, cols=200):
     m, s = os.openpty()
     
@@ -57,7 +60,15 @@ def blocking_drain_once(fd):
 
 
 @asynccontextmanager
-async def terminal(command, onOutput=None):
+async def terminal(command, onOutput=None, scrollback=None, record=True, emulate=False):
+    """Run command in a pty, collecting its output as it arrives.
+
+    With emulate=True, an ansi2txt.Emulator (keeping scrollback rows) follows
+    the output so screen() and text() can be read during the session; the
+    default path never loads ansi2txt. With record=False, output from before
+    the last send() is dropped instead of kept for output(); together with
+    scrollback this bounds the memory a long session uses.
+    """
     m, s = open_raw_pty(100, 200)
     pid = os.fork()
     if pid == 0:
@@ -74,27 +85,53 @@ async def terminal(command, onOutput=None):
         
         last_change = time.monotonic()
         output = []
+        # Index of the first chunk that arrived after the last send()
         checkpoint = 0
+        emulator = None
+        if emulate:
+            import ansi2txt
+            emulator = ansi2txt.Emulator(scrollback)
+        # Cleared when the emulator fails: it keeps the chunk it could not
+        # parse pending, so every later feed() would fail again
+        emulating = emulate
+        # Set by the reader for every chunk; waiters clear it before they scan
+        changed = asyncio.Event()
 
         def onActivity(chunk):
-            nonlocal last_change
+            nonlocal last_change, emulating
             last_change = time.monotonic()
             output.append(chunk)
+            changed.set()
             if onOutput:
                 onOutput(chunk)
+            # Last, so a sequence the emulator cannot handle never costs the recording
+            if emulating:
+                try:
+                    emulator.feed(chunk)
+                except Exception as e:
+                    emulating = False
+                    print(f'termrec: terminal emulation stopped, screen() is frozen: {e!r}', file=sys.stderr)
 
         class Terminal:
-            async def send(self, input, type_delay=0.05, after_delay=0.1):
-                for c in input:
-                    os.write(m, c.encode())
-                    # print('>', c)
-                    await asyncio.sleep(type_delay)
-                        
-                await asyncio.sleep(after_delay)
-                os.write(m, b"\n")
+            async def send(self, input, typing=False, type_delay=0.05, after_delay=0.1):
+                """Enter input as one line: written in one burst, or with typing
+                one character every type_delay seconds and pausing after_delay
+                before the newline."""
+                if typing:
+                    for c in input:
+                        os.write(m, c.encode())
+                        await asyncio.sleep(type_delay)
+
+                    await asyncio.sleep(after_delay)
+                    os.write(m, b"\n")
+                else:
+                    os.write(m, input.encode() + b"\n")
 
                 nonlocal checkpoint
-                checkpoint = sum(len(chunk) for chunk in output)
+                if record:
+                    checkpoint = len(output)
+                else:
+                    output.clear()
                 
             
             async def waitForStability(self, threshold=0.3, timeout=5.0):
@@ -107,22 +144,64 @@ async def terminal(command, onOutput=None):
                     await asyncio.sleep(min(missing, 0.1))  # Async sleep with max of 0.1s
                 return False
             
-            async def waitForOutput(self, pattern: bytes, timeout=5.0):
-                # prog = re.compile(pattern)
-                deadline = time.monotonic() + timeout
-                while time.monotonic() < deadline:
-                    buf = b''.join(output)[checkpoint:]
-                    if pattern in buf:
-                        return True
-                    await asyncio.sleep(0.1)  # Async sleep with max of 0.1s
-                return False
+            async def waitForOutput(self, pattern, timeout=5.0, window=4096):
+                """Wait until the output since the last send() contains pattern:
+                bytes, or a compiled bytes regex.
+
+                Woken by the reader, each chunk is searched once together with
+                the tail of the ones before it: len(pattern) - 1 bytes for a
+                literal, window bytes for a regex (so a regex match must fit in
+                window bytes plus one chunk).
+                """
+                if isinstance(pattern, re.Pattern):
+                    search, keep = pattern.search, window
+                else:
+                    search, keep = (lambda data: pattern in data), len(pattern) - 1
+                deadline = loop.time() + timeout
+                index = checkpoint
+                carry = b''
+                while True:
+                    changed.clear()
+                    while index < len(output):
+                        data = carry + output[index]
+                        index += 1
+                        if search(data):
+                            return True
+                        carry = data[-keep:] if keep else b''
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return False
+                    try:
+                        await asyncio.wait_for(changed.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass  # one last scan, then give up
             
+            async def waitForPrompt(self, timeout=5.0, settle=0.05):
+                """Wait until the shell reads input again after the last send(),
+                then for settle seconds of quiet. The default only covers a
+                prompt drawn in one go; asynchronous redraws (Powerlevel10k's
+                git status) need a longer settle, see capture_prompts.THEME_SETTLE."""
+                return (await self.waitForOutput(PROMPT_READY, timeout)
+                        and await self.waitForStability(settle, timeout))
+
             def output(self):
                 return b''.join(output)
             
             def outputChunks(self):
                 return list(output)
 
+            def screen(self):
+                """The live ansi2txt.Screen; it keeps changing as output arrives
+                until the emulator meets output it cannot parse."""
+                if emulator is None:
+                    raise RuntimeError('screen() needs terminal(..., emulate=True)')
+                return emulator.screen
+
+            def text(self):
+                """The screen rendered so far, as ansi2txt renders a finished recording."""
+                self.screen()  # checks that emulation was requested
+                return emulator.text()
+
         # Start the reader task
         loop = asyncio.get_running_loop()
         loop.add_reader(m, lambda: onActivity(blocking_drain_once(m)))
@@ -4,37 +4,146 @@
 Never blindly copy assets/* to verified-prompts/ without analysis.
 
 This script compares generated test files with verified baselines to detect regressions.
+
+verified-prompts/manifest.json records, per scenario, the hash of the verified
+.ansi capture, a hash of its rendered cell grid (characters plus style, see
+ansi2txt.cellDigest) and the hashes of its verified output files. Only the new
+captures in assets/ are hashed: a capture identical to the verified one passes
+without rendering, and a capture that renders to the same cell grid passes
+however its bytes or the output formats changed. Mismatches are reported as a
+cell-level diff.
+
+    python tools/verify-prompts.py            # verify assets/ against the manifest
+    python tools/verify-prompts.py --update   # rebuild the manifest from verified-prompts/
 """
 from pathlib import Path
+import hashlib
+import json
 import sys
 
+import ansi2txt
+
 VERIFIED = Path('verified-prompts')
 UNVERIFIED = Path('assets')
+MANIFEST = VERIFIED / 'manifest.json'
+OUTPUTS = ('.txt', '.decoded', '.svg')
+
+# Differing rows shown per scenario
+MAX_DIFF_ROWS = 20
+
+
+def sha256(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def render(path):
+    return ansi2txt.render(ansi2txt.parse(path.read_bytes()))
+
+
+def manifest_entry(ansi):
+    files = {}
+    for suffix in OUTPUTS:
+        output = ansi.with_suffix(suffix)
+        if output.exists():
+            files[suffix] = sha256(output)
+    return {'ansi': sha256(ansi), 'cells': ansi2txt.cellDigest(render(ansi)), 'files': files}
+
+
+def update():
+    manifest = {ansi.stem: manifest_entry(ansi) for ansi in sorted(VERIFIED.glob('test-*.ansi'))}
+    MANIFEST.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    print(f'Wrote {MANIFEST} ({len(manifest)} scenarios)')
+
+
+def column_ranges(cols):
+    """Group sorted column indexes into [start, end) runs of adjacent columns."""
+    start = end = None
+    for col in cols:
+        if col != end:
+            if start is not None:
+                yield start, end
+            start = col
+        end = col + 1
+    if start is not None:
+        yield start, end
+
+
+def cell_diff(expected, actual):
+    """Yield one line per run of differing cells, naming its row and columns (1-based)."""
+    rows = 0
+    for row in range(max(len(expected), len(actual))):
+        want = list(expected.cells(row)) if row < len(expected) else []
+        got = list(actual.cells(row)) if row < len(actual) else []
+        if want == got:
+            continue
+        rows += 1
+        if rows > MAX_DIFF_ROWS:
+            yield '    ...'
+            return
+        width = max(len(want), len(got))
+        want += [('', None)] * (width - len(want))
+        got += [('', None)] * (width - len(got))
+        for start, end in column_ranges(col for col in range(width) if want[col] != got[col]):
+            wantText = ''.join(char for char, _ in want[start:end])
+            gotText = ''.join(char for char, _ in got[start:end])
+            line = f'    row {row + 1}, cols {start + 1}-{end}: '
+            if wantText != gotText:
+                yield line + f'expected {wantText!r}, got {gotText!r}'
+            else:
+                # Same characters: name the first style that changed
+                wantStyle, gotStyle = next((w[1], g[1]) for w, g in zip(want[start:end], got[start:end]) if w != g)
+                yield line + f'{wantText!r} styled {ansi2txt.styleKey(wantStyle)}, got {ansi2txt.styleKey(gotStyle)}'
+
+
+def verify():
+    if not MANIFEST.exists():
+        print(f'No {MANIFEST}; run `python tools/verify-prompts.py --update`')
+        return 1
+    manifest = json.loads(MANIFEST.read_text())
+    captures = {ansi.stem: ansi for ansi in UNVERIFIED.glob('test-*.ansi')}
+
+    missing = captures.keys() - manifest.keys()
+    extra = manifest.keys() - captures.keys()
+    mismatch = {}
+    restyled = []
+    for name in sorted(captures.keys() & manifest.keys()):
+        ansi = captures[name]
+        expected = manifest[name]
+        if sha256(ansi) != expected['ansi']:
+            actual = render(ansi)
+            if ansi2txt.cellDigest(actual) != expected['cells']:
+                mismatch[name] = list(cell_diff(render(VERIFIED / ansi.name), actual))
+                continue
+        # Same screen: output files that differ only reflect format changes
+        changed = [suffix for suffix, digest in expected['files'].items()
+                   if ansi.with_suffix(suffix).exists() and sha256(ansi.with_suffix(suffix)) != digest]
+        if changed:
+            restyled.append(f'{name} ({", ".join(changed)})')
+
+    if missing:
+        print("Missing verified files:")
+        for f in sorted(missing):
+            print("  ", f)
+
+    if extra:
+        print("Extra verified files:")
+        for f in sorted(extra):
+            print("  ", f)
+
+    if mismatch:
+        print("Mismatched files:")
+        for f, diff in mismatch.items():
+            print("  ", f)
+            for line in diff:
+                print(line)
+
+    if restyled:
+        print("Output files changed with an identical screen (format changes, not failures):")
+        for f in restyled:
+            print("  ", f)
+
+    return 1 if missing or extra or mismatch else 0
+
 
-inputFiles = set(f.name for f in UNVERIFIED.glob('test-*.svg'))
-outputFiles = set(f.name for f in VERIFIED.glob('test-*.svg'))
-
-missing = inputFiles - outputFiles
-extra = outputFiles - inputFiles
-common = inputFiles & outputFiles
-mismatch = [f for f in common if (UNVERIFIED / f).read_bytes() != (VERIFIED / f).read_bytes()]
-
-if missing:
-    print("Missing verified files:")
-    for f in sorted(missing):
-        print("  ", f)
-
-if extra:
-    print("Extra verified files:")
-    for f in sorted(extra):
-        print("  ", f)
-
-if mismatch:
-    print("Mismatched files:")
-    for f in sorted(mismatch):
-        print("  ", f)
-
-if missing or extra or mismatch:
-    sys.exit(1)
-else:
-    sys.exit(0)
+if __name__ == '__main__':
+    sys.exit(update() if '--update' in sys.argv[1:] else verify())